@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Description:
+A local mock VeloCloud Orchestrator (VCO), to measure vcoclient.py without a production orchestrator.
+
+It implements the login/logout urls, the JSON-RPC 2.0 portal (single and batch requests) and the livepull url
+with synthetic, deterministic payloads of configurable size and latency:
+
+    python3 benchmarks/mockvco.py --port 8080 --enterprises 50 --edges 200 --latency 20
+    export VCO_HOST=http://127.0.0.1:8080
+    vcoclient.py login --username user --password pass
+
+POST /stats returns the number of HTTP requests and API calls served so far.
+"""
+
+import argparse
+import functools
+import json
+import random
+import ssl
+import sys
+import threading
+import time
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockVco(object):
+    """
+    Synthetic VCO data of the given size, the same for the same arguments
+    """
+    def __init__(self, enterprises=10, edges=50, links=2, padding=0, seed=1):
+        self.enterprises = enterprises
+        self.edges = edges
+        self.links = links
+        self.padding = padding
+        self.seed = seed
+        self.requests = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.methods = {
+            "enterprise/getEnterpriseEdges"                  : self.get_enterprise_edges,
+            "network/getNetworkEnterprises"                  : self.get_enterprises,
+            "enterpriseProxy/getEnterpriseProxyEnterprises"  : self.get_enterprises,
+            "enterprise/getEnterpriseAddresses"              : self.get_enterprise_addresses,
+            "gateway/getGatewayEdgeAssignments"              : self.get_gateway_edges,
+            "metrics/getEdgeLinkMetrics"                     : self.get_link_metrics,
+            "monitoring/getAggregateEdgeLinkMetrics"         : self.get_link_metrics,
+            "systemProperty/insertOrUpdateSystemProperty"    : self.set_system_property,
+            "liveMode/enterLiveMode"                         : self.enter_live_mode,
+            "liveMode/readLiveData"                          : self.read_live_data,
+            "liveMode/requestLiveActions"                    : self.exit_live_mode,
+            "liveMode/exitLiveMode"                          : self.exit_live_mode,
+            "liveMode/clientExitLiveMode"                    : self.exit_live_mode,
+        }
+
+    def call(self, request):
+        """
+        Answers one JSON-RPC 2.0 request object
+        """
+        with self.lock:
+            self.calls += 1
+        method = str(request.get("method", "")).strip("/")
+        if method not in self.methods:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": "Method not found: " + method}}
+        try:
+            result = self.methods[method](**(request.get("params") or {}))
+        except Exception as e:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32602, "message": "{}: {}".format(type(e).__name__, e)}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    def get_enterprises(self, **params):
+        return [{"id": i, "name": "Customer{}".format(i), "edgeCount": self.edges, "accountNumber": "ACC{:06d}".format(i)}
+                for i in range(1, self.enterprises + 1)]
+
+    def get_enterprise_edges(self, enterpriseId=None, **params):
+        if not 1 <= int(enterpriseId) <= self.enterprises:
+            raise ValueError("enterpriseId {} not found".format(enterpriseId))
+        return [self.edge(int(enterpriseId), i, tuple(params.get("with") or [])) for i in range(self.edges)]
+
+    @functools.lru_cache(maxsize=None)
+    def edge(self, enterpriseid, i, withs=()):
+        rnd = random.Random(self.seed * 1000003 + enterpriseid * 100003 + i)
+        d = {"id": self.edge_id(enterpriseid, i),
+             "name": "Customer{}-Branch{}".format(enterpriseid, i),
+             "enterpriseId": enterpriseid,
+             "edgeState": rnd.choice(["CONNECTED", "OFFLINE", "NEVER_ACTIVATED", "DEGRADED"]),
+             "activationState": "ACTIVATED",
+             "modelNumber": rnd.choice(["edge510", "edge520", "edge540", "edge840", "virtual"]),
+             "serialNumber": "VMware-{:016x}".format(rnd.getrandbits(64)),
+             "softwareVersion": "4.{}.{}".format(rnd.randint(0, 5), rnd.randint(0, 3)),
+             "haState": None,
+             "isLive": rnd.randint(0, 1)}
+        if "site" in withs:
+            d["site"] = {"name": "Site{}".format(i), "city": rnd.choice(["Berlin", "Paris", "Madrid"]),
+                         "lat": rnd.uniform(-90, 90), "lon": rnd.uniform(-180, 180), "contactEmail": "noc@example.com"}
+        if "recentLinks" in withs:
+            d["recentLinks"] = [{"id": self.link_id(d["id"], l), "interface": "GE{}".format(l + 3), "state": "STABLE",
+                                 "bytesRx": rnd.randint(0, 10**9)} for l in range(self.links)]
+        if "configuration" in withs:
+            d["configuration"] = {"enterprise": {"id": enterpriseid, "name": "Customer{}".format(enterpriseid),
+                                  "modules": [{"id": m, "name": n, "version": "1.0", "data": "x" * self.padding}
+                                              for m, n in enumerate(["deviceSettings", "firewall", "QOS", "WAN", "controlPlane"])]}}
+        if "certificateSummary" in withs:
+            d["certificateSummary"] = {"certificateId": d["id"], "validTo": "2030-01-01T00:00:00.000Z"}
+        return d
+
+    def get_enterprise_addresses(self, enterpriseId=None, **params):
+        return [{"type": "gateway", "id": g, "name": "gateway{}".format(g), "address": "192.0.2.{}".format(g)}
+                for g in range(1, 3)]
+
+    def get_gateway_edges(self, gatewayId=None, **params):
+        return [{"edgeId": self.edge_id(e, 0), "enterpriseId": e, "name": "Customer{}-Branch0".format(e), "gatewayId": gatewayId}
+                for e in range(1, self.enterprises + 1)]
+
+    def get_link_metrics(self, interval=None, metrics=None, edgeId=None, enterpriseId=None, **params):
+        hours = (interval["end"] - interval["start"]) / 3600000.0
+        edges = [edgeId] if edgeId is not None else [self.edge_id(int(enterpriseId), i) for i in range(self.edges)]
+        out = []
+        for d in edges:
+            for l in range(self.links):
+                r = {"linkId": self.link_id(d, l), "name": "GE{}".format(l + 3),
+                     "link": {"edgeId": d, "interface": "GE{}".format(l + 3), "internalId": "{:032x}".format(self.link_id(d, l)), "state": "STABLE"}}
+                for m in metrics or []:
+                    # Counters grow with the interval, everything else stays constant over time
+                    r[m] = int(hours * 1000 * (l + 1)) if "Bytes" in m or "Packets" in m or m.startswith(("bytes", "packets")) else 10.0 * (l + 1)
+                out.append(r)
+        return out
+
+    def set_system_property(self, name=None, value=None, **params):
+        return {"id": 1, "rows": 1}
+
+    def enter_live_mode(self, edgeId=None, **params):
+        return {"token": "live-{}".format(edgeId), "actionsRequestToken": "actions-{}".format(edgeId)}
+
+    def read_live_data(self, token=None, **params):
+        edgeid = int(str(token).rsplit("-", 1)[-1])
+        t = int(time.time())
+        # Only every other link changes between two reads
+        return {"data": {"linkStats": {"data": [{"timestamp": t, "data": [
+                    {"linkId": self.link_id(edgeid, l), "interface": "GE{}".format(l + 3), "state": "STABLE",
+                     "bytesRx": t // 2 * (l + 1) if l % 2 else 1000} for l in range(self.links)]}]}},
+                "status": {"isActive": True}}
+
+    def exit_live_mode(self, **params):
+        return {"ok": True}
+
+    @staticmethod
+    def edge_id(enterpriseid, i):
+        return enterpriseid * 100000 + i
+
+    @staticmethod
+    def link_id(edgeid, l):
+        return edgeid * 10 + l
+
+
+def handler(vco, latency=0.0):
+    """
+    Returns the request handler class serving the given MockVco
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            with vco.lock:
+                vco.requests += 1
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            path = self.path.split("?")[0]
+            headers = {}
+            if path in ("/login/operatorLogin", "/login/enterpriseLogin", "/login/doOperatorLogin", "/login/doEnterpriseLogin"):
+                out = b""
+                headers["Set-Cookie"] = "velocloud.session=mock-{}; Path=/".format(int(time.time()))
+            elif path == "/logout":
+                out = b""
+            elif path == "/stats":
+                out = json.dumps({"requests": vco.requests, "calls": vco.calls}).encode()
+            elif path.rstrip("/") in ("/portal", "/livepull/liveData"):
+                if latency:
+                    time.sleep(latency)
+                try:
+                    request = json.loads(body or b"{}")
+                except ValueError:
+                    out = json.dumps({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}}).encode()
+                else:
+                    if isinstance(request, list):
+                        out = json.dumps([vco.call(r) for r in request]).encode()
+                    else:
+                        out = json.dumps(vco.call(request)).encode()
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(out)
+
+    return Handler
+
+def serve(port=0, latency=0.0, certfile=None, keyfile=None, **kwargs):
+    """
+    Returns the (not yet started) server of a MockVco with the given size, on 127.0.0.1 and the given port (0 for any free port)
+    """
+    vco = MockVco(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler(vco, latency))
+    server.daemon_threads = True
+    if certfile:
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(certfile, keyfile)
+        server.socket = ctx.wrap_socket(server.socket, server_side=True)
+    server.vco = vco
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock VCO serving synthetic payloads")
+    parser.add_argument("--port", action="store", type=int, default=8080, help="Port to listen on 127.0.0.1, 0 for any free port")
+    parser.add_argument("--enterprises", action="store", type=int, default=10, help="Number of enterprises")
+    parser.add_argument("--edges", action="store", type=int, default=50, help="Number of edges per enterprise")
+    parser.add_argument("--links", action="store", type=int, default=2, help="Number of links per edge")
+    parser.add_argument("--padding", action="store", type=int, default=0, help="Additional bytes per configuration module, to grow edges_get_detail payloads")
+    parser.add_argument("--latency", action="store", type=float, default=0.0, help="Latency in ms added to every API request")
+    parser.add_argument("--seed", action="store", type=int, default=1, help="Seed of the synthetic data")
+    parser.add_argument("--certfile", action="store", default=None, help="Serves https with the given certificate")
+    parser.add_argument("--keyfile", action="store", default=None, help="Private key of the certificate")
+    args = parser.parse_args()
+
+    server = serve(port=args.port, latency=args.latency / 1000, certfile=args.certfile, keyfile=args.keyfile,
+                   enterprises=args.enterprises, edges=args.edges, links=args.links, padding=args.padding, seed=args.seed)
+    print("Mock VCO listening on {}://127.0.0.1:{}".format("https" if args.certfile else "http", server.server_address[1]), file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Description:
+End-to-end benchmark of vcoclient.py against the local mock VCO (benchmarks/mockvco.py).
+
+Every scenario (method and output format) runs in a fresh Python process and reports the median of:
+ - latency: wall time of the whole process
+ - req/s: HTTP requests served by the mock VCO per second of latency
+ - peak RSS of the process
+ - time per stage: import, parse (argparse), api (requests and decoding), format (format_by_name) and print
+
+The mock data is deterministic, hence results saved via --save on one commit can be compared with --compare
+on another commit, e.g.:
+
+    python3 benchmarks/run.py --save before.json
+    git checkout my-branch
+    python3 benchmarks/run.py --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+here = os.path.abspath(os.path.dirname(__file__))
+root = os.path.dirname(here)
+sys.path.insert(0, here)
+
+import mockvco
+
+# Method arguments per scenario, each one is run with every output format
+scenarios = {
+    "operator_customers_get"   : ["operator_customers_get"],
+    "edges_get_simple"         : ["edges_get_simple", "--enterpriseid", "1"],
+    "edges_get_detail"         : ["edges_get_detail", "--enterpriseid", "1"],
+    "edges_get_simple_all"     : ["edges_get_simple", "--enterpriseid", "all"],
+    "edges_get_detail_search"  : ["edges_get_detail", "--enterpriseid", "1", "--search", "GE3|offline"],
+    "edges_get_lm"             : ["edges_get_lm", "--enterpriseid", "1", "--edgeid", "100000", "--starttime", "2019-10-01", "--endtime", "2019-10-08"],
+    "edges_get_lm_slice"       : ["edges_get_lm", "--enterpriseid", "1", "--edgeid", "100000", "--starttime", "2019-10-01", "--endtime", "2019-10-08", "--slice", "1d"],
+    "edges_get_agg_lm"         : ["edges_get_agg_lm", "--enterpriseid", "1", "--starttime", "2019-10-01", "--endtime", "2019-10-08"],
+}
+
+outputs = ["pandas", "json", "csv", "ndjson"]
+
+# Runs one scenario within the child process and writes the time per stage and the peak RSS to a json file
+probe = """
+import sys, time, json, resource
+stages = {{"import": 0.0, "parse": 0.0, "api": 0.0, "format": 0.0, "print": 0.0}}
+t = time.perf_counter()
+sys.path.insert(0, {root!r})
+import vcoclient
+stages["import"] = time.perf_counter() - t
+
+def timed(f, stage):
+    def wrapper(*args, **kwargs):
+        t = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            stages[stage] += time.perf_counter() - t
+    return wrapper
+
+# format_by_name runs within the api call, hence it is subtracted from the api stage afterwards
+vcoclient.VcoApiExecute._VcoApiExecute__internal_call = timed(vcoclient.VcoApiExecute._VcoApiExecute__internal_call, "api")
+vcoclient.VcoApiExecute.format_by_name = timed(vcoclient.VcoApiExecute.format_by_name, "format")
+
+t = time.perf_counter()
+args = vcoclient.build_parser().parse_args({argv!r})
+stages["parse"] = time.perf_counter() - t
+obj = vcoclient.VcoApiExecute(**vars(args))
+stages["api"] -= stages["format"]
+t = time.perf_counter()
+if obj.p is not None:
+    print(obj.p)
+sys.stdout.flush()
+stages["print"] = time.perf_counter() - t
+with open({result!r}, "w") as f:
+    json.dump({{"stages": stages, "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}}, f)
+"""
+
+def stats(server):
+    return server.vco.requests, server.vco.calls
+
+def run(argv, env, tmp):
+    """
+    Runs vcoclient.py with the given arguments in a fresh process, returns the measurements of that run
+    """
+    result = os.path.join(tmp, "result.json")
+    before = stats(server)
+    t = time.perf_counter()
+    p = subprocess.run([sys.executable, "-c", probe.format(root=root, argv=argv, result=result)],
+                       env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    latency = time.perf_counter() - t
+    after = stats(server)
+    if p.returncode != 0:
+        raise RuntimeError("vcoclient.py {} failed: {}".format(" ".join(argv), p.stderr.strip().splitlines()[-1:]))
+    with open(result) as f:
+        r = json.load(f)
+    r["latency"] = latency
+    r["requests"] = after[0] - before[0]
+    r["calls"] = after[1] - before[1]
+    return r
+
+def summarize(runs):
+    """
+    Median of every measurement over all runs
+    """
+    return {
+        "latency_ms": round(statistics.median(r["latency"] for r in runs) * 1000, 2),
+        "req_per_s": round(statistics.median(r["requests"] / r["latency"] for r in runs), 2),
+        "requests": runs[0]["requests"],
+        "calls": runs[0]["calls"],
+        "rss_mb": round(statistics.median(r["rss"] for r in runs) / 2**20, 2),
+        "stages_ms": {k: round(statistics.median(r["stages"][k] for r in runs) * 1000, 2) for k in runs[0]["stages"]},
+    }
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def report(results, baseline=None):
+    print("{:<42} {:>10} {:>8} {:>6} {:>8}  {}".format("scenario", "latency ms", "req/s", "reqs", "rss MB", "import/parse/api/format/print ms"))
+    for name, r in results.items():
+        line = "{:<42} {:>10.2f} {:>8.2f} {:>6} {:>8.2f}  {}".format(name, r["latency_ms"], r["req_per_s"], r["requests"], r["rss_mb"],
+                                                                   "/".join("{:.1f}".format(v) for v in r["stages_ms"].values()))
+        b = (baseline or {}).get(name)
+        if b:
+            line += "  latency {:+.1f}% rss {:+.1f}%".format((r["latency_ms"] / b["latency_ms"] - 1) * 100, (r["rss_mb"] / b["rss_mb"] - 1) * 100)
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of vcoclient.py against a local mock VCO")
+    parser.add_argument("--runs", action="store", type=int, default=5, help="Number of runs per scenario, the median is reported")
+    parser.add_argument("--scenario", action="append", default=None, choices=list(scenarios), help="Scenario to run, can be given several times. Default all")
+    parser.add_argument("--output", action="append", default=None, choices=outputs, help="Output format to run, can be given several times. Default all")
+    parser.add_argument("--enterprises", action="store", type=int, default=20, help="Number of enterprises of the mock VCO")
+    parser.add_argument("--edges", action="store", type=int, default=500, help="Number of edges per enterprise of the mock VCO")
+    parser.add_argument("--links", action="store", type=int, default=2, help="Number of links per edge of the mock VCO")
+    parser.add_argument("--padding", action="store", type=int, default=256, help="Additional bytes per configuration module of edges_get_detail")
+    parser.add_argument("--latency", action="store", type=float, default=10.0, help="Latency in ms the mock VCO adds to every API request")
+    parser.add_argument("--json", action="store_true", default=False, help="Output the results as json")
+    parser.add_argument("--save", action="store", default=None, help="Saves the results as json to the given file, to be compared later")
+    parser.add_argument("--compare", action="store", default=None, help="Compares the results with ones saved before via --save")
+    args = parser.parse_args()
+
+    mock = {"enterprises": args.enterprises, "edges": args.edges, "links": args.links, "padding": args.padding, "latency": args.latency}
+    server = mockvco.serve(port=0, latency=args.latency / 1000, enterprises=args.enterprises, edges=args.edges, links=args.links, padding=args.padding)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, VCO_HOST="http://127.0.0.1:{}".format(server.server_address[1]), VCO_COOKIE_PATH=tmp + "/", VCO_TOKEN="")
+        subprocess.run([sys.executable, os.path.join(root, "vcoclient.py"), "login", "--username", "bench", "--password", "bench"], env=env, check=True)
+        for name in args.scenario or scenarios:
+            for output in args.output or outputs:
+                argv = ["--output", output, "--no-cache"] + scenarios[name]
+                run(argv, env, tmp)  # warmup, e.g. for the file system cache
+                results["{} [{}]".format(name, output)] = summarize([run(argv, env, tmp) for _ in range(args.runs)])
+    server.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    doc = {"commit": commit(), "python": platform.python_version(), "platform": platform.platform(), "runs": args.runs, "mock": mock, "results": results}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(doc, f, indent=2)
+    if args.json:
+        print(json.dumps(doc))
+    else:
+        report(results, baseline)
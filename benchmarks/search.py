@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Description:
+Benchmarks ``--search`` of format_by_name on a synthetic edges_get_detail payload.
+
+The flattened index (VcoFlatIndex) is compared against the former recursive search, both for speed
+and for giving exactly the same result.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+here = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+import vcoclient
+
+def synthetic_edges(count, seed=1):
+    """
+    Returns a list of edges, shaped like the result of enterprise/getEnterpriseEdges with all "with" options
+    """
+    rnd = random.Random(seed)
+    states = ["CONNECTED", "OFFLINE", "NEVER_ACTIVATED", "DEGRADED"]
+    models = ["edge510", "edge520", "edge540", "edge840", "virtual"]
+    edges = []
+    for i in range(count):
+        edges.append({
+            "id": i,
+            "name": "Branch{}".format(i),
+            "enterpriseId": 1,
+            "edgeState": rnd.choice(states),
+            "modelNumber": rnd.choice(models),
+            "serialNumber": "VMware-{:016x}".format(rnd.getrandbits(64)),
+            "softwareVersion": "4.{}.{}".format(rnd.randint(0, 5), rnd.randint(0, 3)),
+            "haState": None,
+            "isLive": rnd.randint(0, 1),
+            "site": {"city": rnd.choice(["Berlin", "Paris", "Madrid"]), "lat": rnd.uniform(-90, 90), "lon": rnd.uniform(-180, 180), "contactEmail": "noc@example.com"},
+            "recentLinks": [{"id": j, "interface": rnd.choice(["GE3", "GE4", "USB1", "USB2"]), "state": "STABLE", "bytesRx": rnd.randint(0, 10**9)} for j in range(rnd.randint(1, 3))],
+            "configuration": {"enterprise": {"id": 1, "name": "Customer", "modules": [{"id": m, "name": n, "version": "1.0"} for m, n in enumerate(["deviceSettings", "firewall", "QOS", "WAN", "controlPlane"])]}},
+            "cloudServices": [],
+            "vnfs": {"edge": {"vnfs": []}},
+            "certificateSummary": {"certificateId": i, "validTo": "2030-01-01T00:00:00.000Z"},
+        })
+    return edges
+
+def legacy_search(y, z):
+    """
+    The former recursive search of VcoApiExecute, kept here as reference
+    """
+    def rsearch(x, s, p=''):
+        if isinstance(x, dict):
+            for _ in x:
+                yield from rsearch(x[_], s, p + _ + "_")
+        elif isinstance(x, list):
+            i = 0
+            for _ in x:
+                yield from rsearch(_, s, p + str(i) + "_")
+                i += 1
+        elif s != "*":
+            for _ in s.split("|"):
+                if _.upper() in str(x).upper():
+                    yield p[:-1], x
+        else:
+            yield p[:-1], x
+    return rsearch(y, z)
+
+def legacy_expand(j, search):
+    expand = {}
+    for k, v in legacy_search(j, search):
+        i, *_ = k.split("_")
+        n = j[int(i)]["name"]
+        k = k[len(i)+1:]
+        expand.setdefault(n, {})
+        expand[n]["name"] = n
+        expand[n][k] = v
+    return expand
+
+def index_expand(j, search, index=None):
+    expand = {}
+    for i, k, v in (index or vcoclient.VcoFlatIndex(j)).search(search):
+        n = j[i]["name"]
+        expand.setdefault(n, {})
+        expand[n]["name"] = n
+        expand[n][k] = v
+    return expand
+
+def timed(f, *args):
+    t = time.perf_counter()
+    r = f(*args)
+    return r, time.perf_counter() - t
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of --search on a synthetic edges_get_detail payload")
+    parser.add_argument("--edges", action="store", type=int, default=10000, help="Number of edges in the payload")
+    parser.add_argument("--search", action="append", default=None, help="Search to benchmark, can be given several times")
+    args = parser.parse_args()
+
+    searches = args.search or ["USB", "usb1|ge3|offline", "edge5", "*", "notfound"]
+    j = synthetic_edges(args.edges)
+
+    # Index built once and reused, e.g. for several searches on the same result
+    index, t_build = timed(vcoclient.VcoFlatIndex, j)
+    index.match("warmup")
+
+    failed = False
+    print("{:<24} {:>12} {:>12} {:>8} {:>14}  {}".format("search", "legacy (s)", "index (s)", "speedup", "reused idx (s)", "identical"))
+    for search in searches:
+        old, t_old = timed(legacy_expand, j, search)
+        new, t_new = timed(index_expand, j, search)
+        _, t_reused = timed(index_expand, j, search, index)
+        same = old == new and [list(x) for x in old.values()] == [list(x) for x in new.values()]
+        failed = failed or not same
+        print("{:<24} {:>12.3f} {:>12.3f} {:>7.1f}x {:>14.3f}  {}".format(search, t_old, t_new, t_old / max(t_new, 1e-9), t_reused, same))
+    print("{} edges, {} values, index built in {:.3f} s".format(len(j), len(index.values), t_build))
+
+    if failed:
+        sys.exit(1)
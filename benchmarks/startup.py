@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Description:
+Measures the cold startup time of vcoclient.py per method, i.e. importing the module, building the
+argparse object and parsing the arguments of the given method, each in a fresh Python process.
+
+It also checks that pandas is not imported at startup, which is the biggest part of the startup time.
+Use --max-ms to fail (exit code 1) if any method gets slower than the given time, e.g. within CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+here = os.path.abspath(os.path.dirname(__file__))
+root = os.path.dirname(here)
+
+# Minimal arguments needed per method to pass argparse
+methods = {
+    "login"                  : ["--username", "user", "--password", "pass"],
+    "logout"                 : [],
+    "edges_get_simple"       : ["--enterpriseid", "1"],
+    "edges_get_detail"       : ["--enterpriseid", "1"],
+    "edges_get_lm"           : ["--enterpriseid", "1", "--edgeid", "1", "--starttime", "2019-10-01"],
+    "edges_get_agg_lm"       : ["--enterpriseid", "1", "--starttime", "2019-10-01"],
+    "operator_customers_get" : [],
+    "msp_customers_get"      : [],
+    "gateway_get_edges"      : ["--gatewayid", "1"],
+    "enterprise_get_gateway" : ["--enterpriseid", "1"],
+    "sysprop_set"            : ["--name", "name", "--value", "value"],
+}
+
+probe = """
+import sys, time, json
+t = time.perf_counter()
+sys.path.insert(0, {root!r})
+import vcoclient
+vcoclient.build_parser().parse_args({argv!r})
+print(json.dumps({{"ms": (time.perf_counter() - t) * 1000, "pandas": "pandas" in sys.modules}}))
+"""
+
+def measure(method, runs):
+    """
+    Returns the median startup time in ms for the given method and whether pandas got imported
+    """
+    argv = ["--vco", "localhost", method] + methods[method]
+    times = []
+    pandas = False
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", probe.format(root=root, argv=argv)],
+                             check=True, capture_output=True, text=True).stdout
+        r = json.loads(out)
+        times.append(r["ms"])
+        pandas = pandas or r["pandas"]
+    return statistics.median(times), pandas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold startup benchmark of vcoclient.py per method")
+    parser.add_argument("--runs", action="store", type=int, default=5, help="Number of runs per method, the median is reported")
+    parser.add_argument("--max-ms", action="store", type=float, default=None, help="Fail if the median of any method is above the given time in ms")
+    parser.add_argument("--json", action="store_true", default=False, help="Output the results as json")
+    args = parser.parse_args()
+
+    results = {}
+    for method in methods:
+        ms, pandas = measure(method, args.runs)
+        results[method] = {"ms": round(ms, 2), "pandas": pandas}
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for method, r in results.items():
+            print("{:<24} {:>8.2f} ms   pandas imported: {}".format(method, r["ms"], r["pandas"]))
+
+    failed = [m for m, r in results.items() if r["pandas"] or (args.max_ms and r["ms"] > args.max_ms)]
+    if failed:
+        print("Startup regression in: {}".format(", ".join(failed)), file=sys.stderr)
+        sys.exit(1)
@@ -21,10 +21,10 @@ setup(
      long_description_content_type="text/markdown",
      url="https://github.com/iddocohen/vcoclient",
      packages=find_packages(),
-     python_requires=">=3.6",
+     python_requires=">=3.7",
      install_requires=requirements,
+     extras_require={"store": ["pyarrow"], "async": ["aiohttp"]},
      classifiers=[
-         "Programming Language :: Python :: 3.6",
          "Programming Language :: Python :: 3.7",
          "Programming Language :: Python :: 3.8",
          "Programming Language :: Python :: 3.9",
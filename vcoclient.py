@@ -11,7 +11,6 @@ For more visit: https://github.com/iddocohen/vcoclient
 
 
 # Generic Libs
-import requests
 import pickle
 import json
 import re 
@@ -22,19 +21,42 @@ import getpass
 import ast
 import time
 import datetime
+import threading
+import concurrent.futures
+import sqlite3
+import hashlib
+import zlib
+import codecs
+import queue
+import signal
+import contextlib
+import shlex
+import socket
+import socketserver
+import random
+import io
+import contextvars
 
-# Specific Libs
-import pandas as pd
-import numpy as np
-
-# Specific imports
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
+def load_requests():
+    """
+    Requests is only imported once a session is needed, so a command forwarded to the daemon never imports it
+    """
+    import requests
+    from requests.packages.urllib3.exceptions import InsecureRequestWarning
+    return requests, InsecureRequestWarning
 
+def load_pandas():
+    """
+    Pandas and Numpy are only imported on first use, as most methods never touch a DataFrame and the import dominates startup time
+    """
+    import pandas as pd
+    import numpy as np
 
-# TODO: Might want to have some logic to increase rows/columns
-#pd.set_option('display.max_columns', 100)
-#pd.set_option('display.max_rows', 100)
-pd.set_option('display.max_rows', None)
+    # TODO: Might want to have some logic to increase rows/columns
+    #pd.set_option('display.max_columns', 100)
+    #pd.set_option('display.max_rows', 100)
+    pd.set_option('display.max_rows', None)
+    return pd, np
 
 class Password(argparse.Action):
     def __call__(self, parser, namespace, values, option_string):
@@ -46,36 +68,973 @@ class Password(argparse.Action):
 class ApiException(Exception):
     pass
 
-class VcoRequestManager(object):
+# Time to live in seconds of cached API responses per method. Methods not listed here (e.g. metrics or any
+# write like systemProperty/insertOrUpdateSystemProperty) are never cached.
+cache_ttl = {
+    "network/getNetworkEnterprises"                 : 900,
+    "enterpriseProxy/getEnterpriseProxyEnterprises" : 900,
+    "enterprise/getEnterpriseEdges"                 : 30,
+    "enterprise/getEnterpriseAddresses"             : 60,
+    "gateway/getGatewayEdgeAssignments"             : 60,
+}
 
-    #TODO: Give path outside here for the user to alter
-    def __init__(self, hostname, verify_ssl=os.getenv('VCO_VERIFY_SSL', False), path=os.getenv('VCO_COOKIE_PATH', "/tmp/"), token=os.getenv('VCO_TOKEN',"")):
+class VcoResponseCache(object):
+    """
+    On-disk cache of API responses, based on SQLite so several processes can safely share it.
+    Entries are evicted by TTL and, once the cache grows above max_size bytes, by least recent use.
+    A long running process (e.g. the daemon) can additionally keep up to memory decoded entries in memory,
+    which must then be treated as read-only by the caller.
+    """
+    def __init__(self, path=os.getenv('VCO_CACHE_PATH', os.getenv('VCO_COOKIE_PATH', "/tmp/") + "vcoclient_cache.db"), max_size=os.getenv('VCO_CACHE_SIZE', 64 * 1024 * 1024), ttl=None, memory=0):
+        """
+        Init the Class. If ttl is given, it overrides the TTL of every cacheable method.
+        """
+        self._max_size = int(max_size)
+        self._ttl = ttl
+        self._memory_size = int(memory)
+        self._memory = {}
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        is_new = not os.path.isfile(path)
+        try:
+            self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            if is_new:
+                os.chmod(path, 0o600)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, method TEXT, expires REAL, accessed REAL, size INTEGER, value BLOB)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+        except (sqlite3.Error, OSError) as e:
+            raise ApiException("Cannot open cache {}: {}".format(path, e))
+
+    def ttl(self, method):
+        """
+        Returns the TTL in seconds of the given method, 0 if it must not be cached
+        """
+        if method not in cache_ttl:
+            return 0
+        if self._ttl is not None:
+            return max(int(self._ttl), 0)
+        return cache_ttl[method]
+
+    @staticmethod
+    def key(hostname, method, params, identity=None):
+        """
+        Cache key based on hostname, identity (who calls, see VcoRequestBase._identity), method and canonicalized params
+        """
+        raw = json.dumps([hostname, identity, method, params], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Returns a tuple (found, value) for the given key
+        """
+        now = time.time()
+        with self._lock:
+            if key in self._memory and self._memory[key][0] > now:
+                self._hits += 1
+                return True, self._memory[key][1]
+            row = self._db.execute("SELECT value, expires FROM cache WHERE key = ? AND expires > ?", (key, now)).fetchone()
+            if row is None:
+                self._misses += 1
+                self._count("misses")
+                return False, None
+            self._db.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self._hits += 1
+            self._count("hits")
+        value = json.loads(zlib.decompress(row[0]))
+        self._remember(key, row[1], value)
+        return True, value
+
+    def put(self, key, method, value, ttl):
+        """
+        Stores the value for ttl seconds and evicts expired and least recently used entries
+        """
+        blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+        if len(blob) > self._max_size:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)", (key, method, now + ttl, now, len(blob), blob))
+                self._db.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+                if total > self._max_size:
+                    for k, size in self._db.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall():
+                        if total <= self._max_size:
+                            break
+                        self._db.execute("DELETE FROM cache WHERE key = ?", (k,))
+                        total -= size
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        self._remember(key, now + ttl, value)
+
+    def _remember(self, key, expires, value):
+        """
+        Keeps the decoded value in memory, dropping expired and then the oldest entries
+        """
+        if not self._memory_size:
+            return
+        now = time.time()
+        with self._lock:
+            self._memory.pop(key, None)
+            self._memory[key] = (expires, value)
+            if len(self._memory) > self._memory_size:
+                for k in [k for k, (e, v) in self._memory.items() if e <= now]:
+                    del self._memory[k]
+                while len(self._memory) > self._memory_size:
+                    del self._memory[next(iter(self._memory))]
+
+    def clear(self):
+        """
+        Deletes all cached entries
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM cache")
+            self._memory.clear()
+
+    def stats(self):
+        """
+        Returns the hit/miss counters of this object and in total of the cache file
+        """
+        with self._lock:
+            total = dict(self._db.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return { "hits": self._hits, "misses": self._misses,
+                 "total_hits": total.get("hits", 0), "total_misses": total.get("misses", 0),
+                 "entries": entries, "size": size }
+
+    def _count(self, name):
+        """
+        Increments a persistent counter
+        """
+        self._db.execute("INSERT OR IGNORE INTO stats VALUES (?, 0)", (name,))
+        self._db.execute("UPDATE stats SET value = value + 1 WHERE name = ?", (name,))
+
+class VcoTimings(object):
+    """
+    Collects the time spent per phase (e.g. cookie, http, decode, pandas, normalize, transpose, output), the bytes received
+    and values like the number of rows and columns of the result. Thread safe, as the workers share one object,
+    hence phases running on several workers at once are summed up.
+
+    hook is called with (phase, seconds, bytes) at the end of every phase, e.g. to feed the counters of a
+    long running caller. prometheus() returns all counters in the Prometheus text format.
+    """
+    def __init__(self, hook=None):
+        """
+        Init the Class
+        """
+        self.hook = hook
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Starts over with empty counters
+        """
+        with self._lock:
+            self.phases = {}
+            self.bytes = 0
+            self.values = {}
+            self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Measures the time spent within the with block as the given phase
+        """
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t)
+
+    def add(self, name, seconds, nbytes=0):
+        """
+        Adds the time (and received bytes) of one run of the given phase
+        """
+        with self._lock:
+            p = self.phases.setdefault(name, [0.0, 0])
+            p[0] += seconds
+            p[1] += 1
+            self.bytes += nbytes
+        if self.hook is not None:
+            self.hook(name, seconds, nbytes)
+
+    def set(self, key, value):
+        """
+        Sets a value of the report, e.g. rows or columns
+        """
+        with self._lock:
+            self.values[key] = value
+
+    def report(self):
+        """
+        Returns the collected timings as dict, times in seconds
+        """
+        with self._lock:
+            r = {"total": round(time.perf_counter() - self._start, 6),
+                 "phases": {k: {"seconds": round(v[0], 6), "count": v[1]} for k, v in self.phases.items()},
+                 "bytes_received": self.bytes}
+            r.update(self.values)
+        return r
+
+    def prometheus(self, prefix="vcoclient"):
+        """
+        Returns the counters in the Prometheus text exposition format
+        """
+        with self._lock:
+            lines = ["# TYPE {}_phase_seconds_total counter".format(prefix)]
+            lines += ['{}_phase_seconds_total{{phase="{}"}} {}'.format(prefix, k, v[0]) for k, v in self.phases.items()]
+            lines += ["# TYPE {}_phase_runs_total counter".format(prefix)]
+            lines += ['{}_phase_runs_total{{phase="{}"}} {}'.format(prefix, k, v[1]) for k, v in self.phases.items()]
+            lines += ["# TYPE {}_received_bytes_total counter".format(prefix), "{}_received_bytes_total {}".format(prefix, self.bytes)]
+        return "\n".join(lines) + "\n"
+
+def is_idempotent(method):
+    """
+    Only reading methods (get*, read*) are retried, as a write (e.g. systemProperty/insertOrUpdateSystemProperty)
+    might already have been applied by the VCO before the error
+    """
+    return method.strip("/").split("/")[-1].startswith(("get", "read"))
+
+def retry_delay(attempt, retry_after=None, base=0.5, cap=30.0):
+    """
+    Seconds to wait before the given retry: the Retry-After of the VCO if given, else jittered exponential backoff
+    """
+    try:
+        if retry_after is not None:
+            return min(max(float(retry_after), 0.0), cap)
+    except ValueError:
+        pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+# Responses showing that the VCO (or a proxy in front of it) is overloaded, worth a retry later
+retry_status = (429, 502, 503, 504)
+
+class VcoConcurrencyLimit(object):
+    """
+    Adaptive limit of the requests in flight (AIMD): the limit grows by one per round of successful requests and
+    is halved on throttling (HTTP 429/503) or once the latency exceeds tolerance times its moving average,
+    at most once per average latency. Bounded by 1 and maximum.
+    """
+    def __init__(self, maximum, tolerance=3.0):
+        """
+        Init the Class
+        """
+        self.maximum = max(int(maximum), 1)
+        self.limit = float(self.maximum)
+        self._tolerance = tolerance
+        self._inflight = 0
+        self._latency = None
+        self._decreased = 0.0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self._inflight >= int(self.limit):
+                self._cond.wait()
+            self._inflight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify()
+
+    def update(self, latency, throttled=False):
+        """
+        Adjusts the limit after a request which took latency seconds
+        """
+        with self._cond:
+            now = time.time()
+            slow = self._latency is not None and latency > self._tolerance * self._latency
+            if throttled or slow:
+                if now - self._decreased > (self._latency or 0):
+                    self.limit = max(self.limit / 2, 1.0)
+                    self._decreased = now
+            else:
+                self.limit = min(self.limit + 1 / self.limit, float(self.maximum))
+            if not throttled:
+                self._latency = latency if self._latency is None else 0.9 * self._latency + 0.1 * latency
+            self._cond.notify_all()
+
+class VcoCheckpoint(object):
+    """
+    Append-only journal (journal.ndjson within the given directory) of the completed units, i.e. method and params,
+    of a bulk export together with their results, so a rerun of an interrupted export only fetches what is missing.
+    """
+    def __init__(self, path, hostname):
+        """
+        Init the Class and reads the units completed before. A line cut off by a killed job is ignored.
+        """
+        try:
+            os.makedirs(path, exist_ok=True)
+            self._path = os.path.join(path, "journal.ndjson")
+            self._hostname = hostname
+            self.done = {}
+            if os.path.isfile(self._path):
+                with open(self._path) as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        self.done[entry["key"]] = entry["result"]
+            self._f = open(self._path, "a")
+        except OSError as e:
+            raise ApiException("Cannot open checkpoint {}: {}".format(path, e))
+        self._lock = threading.Lock()
+
+    def key(self, method, params):
+        """
+        Key of a unit
+        """
+        return VcoResponseCache.key(self._hostname, method.strip("/"), params)
+
+    def get(self, method, params):
+        """
+        Returns a tuple (found, result) of the given unit
+        """
+        key = self.key(method, params)
+        return key in self.done, self.done.get(key)
+
+    def add(self, method, params, result):
+        """
+        Records a completed unit, flushed to disk right away
+        """
+        key = self.key(method, params)
+        line = json.dumps({"key": key, "method": method, "params": params, "result": result}, separators=(",", ":"), default=str)
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self.done[key] = result
+
+    def close(self):
+        self._f.close()
+
+def is_auth_error(e):
+    """
+    Returns True if the given ApiException shows that the session is not (or no longer) valid
+    """
+    return re.search(r"tokenError|session|not authenticated|unauthori[sz]ed|HTTP 40[13]", str(e), re.IGNORECASE) is not None
+
+class VcoSnapshot(object):
+    """
+    Compact snapshot of a previous result, one content hash per entry (keyed by its id) plus one short hash per
+    flattened field, to report only the entries added, removed or changed since then.
+    """
+    def __init__(self, path):
+        """
+        Init the Class and reads the snapshot, if any
+        """
+        self._path = path
+        self.entries = {}
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)["entries"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            raise ApiException("Cannot read snapshot {}: {}".format(path, e))
+
+    @staticmethod
+    def digest(value, size=8):
+        return hashlib.blake2b(json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode(), digest_size=size).hexdigest()
+
+    @staticmethod
+    def key(entry):
+        """
+        Key of an entry, its id (or name) prefixed by its vco if federated
+        """
+        k = entry.get("id", entry.get("name"))
+        if k is None:
+            raise ApiException("Entries without id or name cannot be diffed")
+        return "{}|{}".format(entry["vco"], k) if "vco" in entry else str(k)
+
+    def diff(self, j, failed=()):
+        """
+        Returns the changes of the given entries against the snapshot, as flat entries with a "change" field
+        (added, removed or changed) and, for changed entries, only the fields which changed (None if gone),
+        together with the new snapshot entries. Entries of failed enterprises or VCOs are kept as they were.
+        """
+        if not isinstance(j, list) or not all(isinstance(x, dict) for x in j):
+            raise ApiException("Only results of entries can be diffed")
+        changes = []
+        entries = {}
+        for x in j:
+            row = flatten_record(x)
+            fields = {k: self.digest(v, 4) for k, v in row.items()}
+            k = self.key(x)
+            entries[k] = {"id": x.get("id"), "name": x.get("name"), "hash": self.digest(sorted(fields.items())), "fields": fields}
+            entries[k].update((s, x[s]) for s in ("enterpriseId", "vco") if s in x)
+            before = self.entries.get(k)
+            if before is None:
+                changes.append(dict(row, change="added"))
+            elif before["hash"] != entries[k]["hash"]:
+                change = {"name": x.get("name"), "id": x.get("id"), "change": "changed"}
+                change.update((f, row.get(f)) for f in list(fields) + list(before["fields"]) if fields.get(f) != before["fields"].get(f))
+                changes.append(change)
+        for k, before in self.entries.items():
+            if k in entries:
+                continue
+            if any(all(before.get(s) == v for s, v in scope.items()) for scope in failed):
+                entries[k] = before
+                continue
+            changes.append({"name": before["name"], "id": before.get("id"), "change": "removed"})
+            changes[-1].update((s, before[s]) for s in ("enterpriseId", "vco") if s in before)
+        return changes, entries
+
+    def save(self, entries):
+        """
+        Replaces the snapshot atomically, so a killed run never leaves a broken snapshot behind
+        """
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+            tmp = "{}.{}.tmp".format(self._path, os.getpid())
+            with open(tmp, "w") as f:
+                json.dump({"version": 1, "entries": entries}, f, separators=(",", ":"), default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._path)
+        except OSError as e:
+            raise ApiException("Cannot write snapshot {}: {}".format(self._path, e))
+        self.entries = entries
+
+class VcoMetricsStore(object):
+    """
+    Local columnar store of link metrics, as Parquet files partitioned by enterprise, edge and day:
+    <path>/<hostname>/enterprise=<id>/edge=<id>/day=<YYYY-MM-DD>/part-<start>-<end>.parquet
+    The end of the last synced window of each edge is kept in state.json.
+    """
+    def __init__(self, path, hostname):
         """
         Init the Class
         """
+        if not path:
+            raise ApiException("Metrics store path not defined")
+        self._root = os.path.join(path, re.sub(r"[^\w.-]", "_", hostname))
+        self._state = os.path.join(self._root, "state.json")
+
+    @staticmethod
+    def key(enterpriseid, edgeid):
+        """
+        Key of an edge within the state
+        """
+        return "{}/{}".format(enterpriseid, edgeid)
+
+    def state(self):
+        """
+        Returns the end of the last synced window in ms per edge
+        """
+        if not os.path.isfile(self._state):
+            return {}
+        with open(self._state) as f:
+            try:
+                return json.load(f)
+            except ValueError as e:
+                raise ApiException("Cannot read {}: {}".format(self._state, e))
+
+    def save_state(self, state):
+        """
+        Saves the state atomically, so a killed sync never leaves a broken state behind
+        """
+        os.makedirs(self._root, exist_ok=True)
+        tmp = self._state + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self._state)
+
+    def append(self, enterpriseid, edgeid, rows):
+        """
+        Appends the given rows (flat dicts having intervalStart and intervalEnd in ms) to the day partitions of the edge
+        """
+        pd, np = load_pandas()
+        days = {}
+        for r in rows:
+            day = datetime.datetime.utcfromtimestamp(r["intervalStart"] / 1000).strftime("%Y-%m-%d")
+            days.setdefault(day, []).append(r)
+        for day, part in days.items():
+            path = os.path.join(self._root, "enterprise={}".format(enterpriseid), "edge={}".format(edgeid), "day={}".format(day))
+            os.makedirs(path, exist_ok=True)
+            name = "part-{}-{}.parquet".format(min(r["intervalStart"] for r in part), max(r["intervalEnd"] for r in part))
+            try:
+                pd.DataFrame(part).to_parquet(os.path.join(path, name), index=False)
+            except ImportError as e:
+                raise ApiException("The metrics store needs pyarrow, install it via 'pip3 install vcoclient[store]': {}".format(e))
+
+    def query(self, enterpriseids=None, edgeids=None, start=0, end=None, bounds=False):
+        """
+        Returns the stored windows fully within start and end, as list of (duration in ms, rows) in time order,
+        or (start, end, rows) if bounds. Rows keep their enterpriseId and edgeId only then.
+        """
+        pd, np = load_pandas()
+        end = end or int(time.time() * 1000)
+        day = datetime.datetime.utcfromtimestamp(start / 1000).date()
+        days = set()
+        while day <= datetime.datetime.utcfromtimestamp(end / 1000).date():
+            days.add("day={}".format(day))
+            day += datetime.timedelta(days=1)
+
+        files = []
+        for ent in self.__dirs(self._root, "enterprise", enterpriseids):
+            for edge in self.__dirs(ent, "edge", edgeids):
+                for d in os.listdir(edge):
+                    if d in days:
+                        files += [os.path.join(edge, d, f) for f in sorted(os.listdir(os.path.join(edge, d))) if f.endswith(".parquet")]
+        if not files:
+            return []
+
+        try:
+            df = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+        except ImportError as e:
+            raise ApiException("The metrics store needs pyarrow, install it via 'pip3 install vcoclient[store]': {}".format(e))
+        df = df[(df["intervalStart"] >= start) & (df["intervalEnd"] <= end)]
+        # A window synced twice (e.g. after a lost state) is only counted once
+        df = df.drop_duplicates(subset=[c for c in ("edgeId", "linkId", "intervalStart", "intervalEnd") if c in df], keep="last")
+        df = df.astype(object).where(df.notna(), None)
+
+        windows = []
+        for (s, e), group in df.groupby(["intervalStart", "intervalEnd"], sort=True):
+            if bounds:
+                windows.append((s, e, group.drop(columns=["intervalStart", "intervalEnd"]).to_dict("records")))
+            else:
+                windows.append((e - s, group.drop(columns=["enterpriseId", "edgeId", "intervalStart", "intervalEnd"]).to_dict("records")))
+        return windows
+
+    @staticmethod
+    def __dirs(path, name, ids):
+        """
+        Returns the partition directories of the given ids, or all of them
+        """
+        if not os.path.isdir(path):
+            return []
+        if ids:
+            dirs = ["{}={}".format(name, i) for i in ids]
+        else:
+            dirs = [d for d in os.listdir(path) if d.startswith(name + "=")]
+        return [os.path.join(path, d) for d in dirs if os.path.isdir(os.path.join(path, d))]
+
+class VcoTopology(object):
+    """
+    Local index of which gateways serve which enterprises and edges, as SQLite database <path>/<hostname>.db,
+    answering impact and reverse lookups without calling the VCO. Enterprises are refreshed one by one,
+    tracked by a fingerprint of their entry in the customers list.
+    """
+    schema = [
+        "CREATE TABLE IF NOT EXISTS enterprises (id INTEGER PRIMARY KEY, name TEXT, fingerprint TEXT, refreshed REAL)",
+        "CREATE TABLE IF NOT EXISTS gateways (id INTEGER PRIMARY KEY, name TEXT, address TEXT)",
+        "CREATE TABLE IF NOT EXISTS edges (id INTEGER PRIMARY KEY, enterprise_id INTEGER, name TEXT, state TEXT, model TEXT)",
+        "CREATE TABLE IF NOT EXISTS enterprise_gateways (enterprise_id INTEGER, gateway_id INTEGER, PRIMARY KEY (enterprise_id, gateway_id))",
+        "CREATE TABLE IF NOT EXISTS edge_gateways (edge_id INTEGER, gateway_id INTEGER, enterprise_id INTEGER, PRIMARY KEY (edge_id, gateway_id))",
+        "CREATE INDEX IF NOT EXISTS enterprises_name ON enterprises (name)",
+        "CREATE INDEX IF NOT EXISTS gateways_name ON gateways (name)",
+        "CREATE INDEX IF NOT EXISTS edges_enterprise ON edges (enterprise_id)",
+        "CREATE INDEX IF NOT EXISTS edges_name ON edges (name)",
+        "CREATE INDEX IF NOT EXISTS enterprise_gateways_gateway ON enterprise_gateways (gateway_id)",
+        "CREATE INDEX IF NOT EXISTS edge_gateways_gateway ON edge_gateways (gateway_id)",
+        "CREATE INDEX IF NOT EXISTS edge_gateways_enterprise ON edge_gateways (enterprise_id)",
+    ]
+
+    def __init__(self, path, hostname):
+        """
+        Init the Class and creates the database if needed
+        """
+        if not path:
+            raise ApiException("Topology path not defined")
+        try:
+            os.makedirs(path, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(path, re.sub(r"[^\w.-]", "_", hostname) + ".db"), timeout=30, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            for statement in self.schema:
+                self._db.execute(statement)
+        except (sqlite3.Error, OSError) as e:
+            raise ApiException("Cannot open topology {}: {}".format(path, e))
+
+    def fingerprints(self):
+        """
+        Returns the fingerprint of every enterprise refreshed before, None if its last refresh failed
+        """
+        return dict(self._db.execute("SELECT id, fingerprint FROM enterprises"))
+
+    def gateways_of(self, enterpriseids):
+        """
+        Returns the gateways serving any of the given enterprises
+        """
+        ids = list(enterpriseids)
+        return {g for g, in self._db.execute("SELECT DISTINCT gateway_id FROM enterprise_gateways WHERE enterprise_id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))}
+
+    def replace(self, enterprises, edges, gateways, enterprise_gateways, edge_gateways, removed=()):
+        """
+        Replaces everything known about the given enterprises (list of (id, name, fingerprint)) within one transaction,
+        and drops the removed ones. Gateways (list of (id, name, address)) are inserted or updated.
+        """
+        ids = json.dumps([e[0] for e in enterprises] + list(removed))
+        now = time.time()
+        try:
+            with self._lock():
+                for table, column in (("edges", "enterprise_id"), ("enterprise_gateways", "enterprise_id"), ("edge_gateways", "enterprise_id"), ("enterprises", "id")):
+                    self._db.execute("DELETE FROM {} WHERE {} IN (SELECT value FROM json_each(?))".format(table, column), (ids,))
+                self._db.executemany("INSERT INTO enterprises VALUES (?, ?, ?, ?)", [(i, n, f, now) for i, n, f in enterprises])
+                self._db.executemany("INSERT OR REPLACE INTO gateways VALUES (?, ?, ?)", gateways)
+                self._db.executemany("INSERT OR REPLACE INTO edges VALUES (?, ?, ?, ?, ?)", edges)
+                self._db.executemany("INSERT OR IGNORE INTO enterprise_gateways VALUES (?, ?)", enterprise_gateways)
+                self._db.executemany("INSERT OR IGNORE INTO edge_gateways VALUES (?, ?, ?)", edge_gateways)
+                # Gateways nobody is assigned to anymore
+                self._db.execute("DELETE FROM gateways WHERE id NOT IN (SELECT gateway_id FROM enterprise_gateways) AND id NOT IN (SELECT gateway_id FROM edge_gateways)")
+        except sqlite3.Error as e:
+            raise ApiException("Cannot update topology: {}".format(e))
+
+    @contextlib.contextmanager
+    def _lock(self):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def __rows(self, sql, *params):
+        cursor = self._db.execute(sql, params)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def __ids(self, table, values):
+        """
+        Resolves the given ids or names (comma separated) of gateways, edges or enterprises to ids
+        """
+        ids = []
+        for v in str(values).split(","):
+            v = v.strip()
+            if v.isdigit():
+                ids.append(int(v))
+            elif v:
+                ids += [i for i, in self._db.execute("SELECT id FROM {} WHERE name = ?".format(table), (v,))]
+        if not ids:
+            raise ApiException("No {} named {} in the topology, run topology_build first".format(table.rstrip("s"), values))
+        return json.dumps(ids)
+
+    def impact(self, gateways, summary=False):
+        """
+        Returns the edges assigned to the given gateways, with the number of their gateways in total, or per enterprise if summary
+        """
+        edges = self.__rows("""
+            SELECT e.name AS name, e.id AS edgeId, e.state AS edgeState, e.model AS modelNumber, e.enterprise_id AS enterpriseId,
+                   c.name AS enterprise, g.id AS gatewayId, g.name AS gateway,
+                   (SELECT COUNT(*) FROM edge_gateways o WHERE o.edge_id = e.id) AS gateways
+            FROM edge_gateways eg JOIN edges e ON e.id = eg.edge_id LEFT JOIN enterprises c ON c.id = e.enterprise_id LEFT JOIN gateways g ON g.id = eg.gateway_id
+            WHERE eg.gateway_id IN (SELECT value FROM json_each(?)) ORDER BY c.name, e.name""", self.__ids("gateways", gateways))
+        if not summary:
+            return edges
+        # Edges assigned to no other gateway than the given ones lose their connectivity
+        given = {}
+        for e in edges:
+            given.setdefault(e["edgeId"], set()).add(e["gatewayId"])
+        enterprises = {}
+        for e in edges:
+            s = enterprises.setdefault(e["enterpriseId"], {"name": e["enterprise"], "enterpriseId": e["enterpriseId"], "edges": set(), "connected": set(), "isolated": set()})
+            s["edges"].add(e["edgeId"])
+            if e["edgeState"] == "CONNECTED":
+                s["connected"].add(e["edgeId"])
+            if e["gateways"] <= len(given[e["edgeId"]]):
+                s["isolated"].add(e["edgeId"])
+        return [dict(s, edges=len(s["edges"]), connected=len(s["connected"]), isolated=len(s["isolated"])) for s in enterprises.values()]
+
+    def edge_gateways(self, edges):
+        """
+        Returns the gateways the given edges are assigned to
+        """
+        return self.__rows("""
+            SELECT g.name AS name, eg.gateway_id AS gatewayId, g.address AS address, e.id AS edgeId, e.name AS edge, e.state AS edgeState,
+                   e.enterprise_id AS enterpriseId, c.name AS enterprise
+            FROM edges e JOIN edge_gateways eg ON eg.edge_id = e.id LEFT JOIN gateways g ON g.id = eg.gateway_id LEFT JOIN enterprises c ON c.id = e.enterprise_id
+            WHERE e.id IN (SELECT value FROM json_each(?)) ORDER BY e.name, g.name""", self.__ids("edges", edges))
+
+    def enterprise_gateways(self, enterprises):
+        """
+        Returns the gateways of the given enterprises with the number of their edges assigned to each
+        """
+        return self.__rows("""
+            SELECT g.name AS name, eg.gateway_id AS gatewayId, g.address AS address, eg.enterprise_id AS enterpriseId, c.name AS enterprise,
+                   (SELECT COUNT(*) FROM edge_gateways x WHERE x.gateway_id = eg.gateway_id AND x.enterprise_id = eg.enterprise_id) AS edges
+            FROM enterprise_gateways eg LEFT JOIN gateways g ON g.id = eg.gateway_id LEFT JOIN enterprises c ON c.id = eg.enterprise_id
+            WHERE eg.enterprise_id IN (SELECT value FROM json_each(?)) ORDER BY c.name, g.name""", self.__ids("enterprises", enterprises))
+
+    def close(self):
+        self._db.close()
+
+class VcoLiveWatch(object):
+    """
+    Enters live mode for the given edges and polls liveMode/readLiveData, yielding only the datapoints which changed
+    since the last poll. Datapoints are buffered in a bounded queue: once it is full, polling pauses until the
+    consumer catches up. Live mode is always exited again, also on errors or if the consumer stops early.
+
+        with VcoLiveWatch(client, [(enterpriseId, edgeId, name)], interval=5) as watch:
+            for datapoint in watch:
+                ...
+    """
+    def __init__(self, client, edges, interval=5, duration=None, buffer_size=1000, workers=4):
+        """
+        Init the Class. edges is a list of (enterpriseId, edgeId, name), duration in seconds (None for endless).
+        """
+        if not edges:
+            raise ApiException("No edges given to watch")
+        self._client = client
+        self._edges = edges
+        self._interval = float(interval)
+        self._duration = duration
+        self._queue = queue.Queue(maxsize=max(int(buffer_size), 1))
+        self._workers = max(int(workers), 1)
+        self._tokens = {}
+        self._last = {}
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        """
+        Yields the changed datapoints until duration is over, then exits live mode
+        """
+        try:
+            self.start()
+            end = time.time() + self._duration if self._duration else None
+            while True:
+                timeout = min(self._interval, max(end - time.time(), 0)) if end else self._interval
+                try:
+                    x = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    if end and time.time() >= end:
+                        break
+                    continue
+                if x is None:
+                    break
+                yield x
+        finally:
+            self.close()
+        if self._error is not None:
+            raise self._error
+
+    def start(self):
+        """
+        Enters live mode for all edges and starts polling in the background
+        """
+        if self._thread is not None:
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._workers) as pool:
+            futures = [(edge, pool.submit(self.__enter_live_mode, edge)) for edge in self._edges]
+        # Every edge which entered live mode is kept, so close() exits it again even if another edge failed
+        errors = []
+        for edge, future in futures:
+            try:
+                self._tokens[edge] = future.result()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        self._thread = threading.Thread(target=self.__poll, name="vco-live-watch", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+        Stops polling and exits live mode of every edge. Errors while exiting are only reported on stderr.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        tokens, self._tokens = self._tokens, {}
+        for (e, d, n), token in tokens.items():
+            try:
+                self._client.call_api("liveMode/clientExitLiveMode", {"token": token})
+            except Exception as ex:
+                print("edgeId {}: cannot exit live mode: {}".format(d, ex), file=sys.stderr)
+
+    def __enter_live_mode(self, edge):
+        """
+        Returns the live mode token of the given edge
+        """
+        e, d, n = edge
+        r = self._client.call_api("liveMode/enterLiveMode", {"enterpriseId": e, "edgeId": d})
+        if not isinstance(r, dict) or "token" not in r:
+            raise ApiException("edgeId {}: live mode not entered".format(d))
+        return r["token"]
+
+    def __read(self, edge):
+        """
+        Reads the live data of one edge, entering live mode again once the VCO ended it
+        """
+        r = self._client.call_api("liveMode/readLiveData", {"token": self._tokens[edge]})
+        if isinstance(r, dict) and (r.get("status") or {}).get("isActive") is False:
+            self._tokens[edge] = self.__enter_live_mode(edge)
+        return r
+
+    def __poll(self):
+        """
+        Polls all edges every interval and queues the changed datapoints. Blocks while the queue is full.
+        """
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self._workers) as pool:
+                while not self._stop.is_set():
+                    t = time.time()
+                    for edge, r in zip(self._edges, pool.map(self.__read, self._edges)):
+                        for x in self.changes(edge, r):
+                            while not self._stop.is_set():
+                                try:
+                                    self._queue.put(x, timeout=0.5)
+                                    break
+                                except queue.Full:
+                                    continue
+                    self._stop.wait(max(self._interval - (time.time() - t), 0))
+        except Exception as ex:
+            self._error = ex if isinstance(ex, ApiException) else ApiException(str(ex))
+        finally:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def changes(self, edge, result):
+        """
+        Returns the datapoints of one readLiveData result which differ from the last seen values of the same edge
+        """
+        e, d, n = edge
+        out = []
+        data = result.get("data") if isinstance(result, dict) else None
+        for category, v in (data or {}).items():
+            samples = v.get("data") if isinstance(v, dict) and isinstance(v.get("data"), list) else [v]
+            for s in samples:
+                ts = s.get("timestamp") if isinstance(s, dict) else None
+                entries = s["data"] if isinstance(s, dict) and isinstance(s.get("data"), list) else [s]
+                for i, x in enumerate(entries):
+                    flat = flatten_record(x) if isinstance(x, dict) else {"value": x}
+                    flat.pop("timestamp", None)
+                    k = next((k for k in ("linkId", "id", "interface", "name") if k in flat), None)
+                    ident = flat[k] if k else i
+                    last = self._last.setdefault((d, category, ident), {})
+                    changed = {f: y for f, y in flat.items() if f not in last or last[f] != y}
+                    if not changed:
+                        continue
+                    last.update(changed)
+                    x = {"name": n, "enterpriseId": e, "edgeId": d, "category": category, "timestamp": ts}
+                    if k:
+                        x[k] = ident
+                    x.update(changed)
+                    out.append(x)
+        return out
+
+class VcoRequestBase(object):
+    """
+    What VcoRequestManager and AsyncVcoRequestManager share besides sending: urls, JSON-RPC payloads, cache keys and the cookie file
+    """
+    def _get_root_url(self, hostname):
+        """
+        Translate VCO hostname to a root url for API calls. https is used unless the hostname starts with http://,
+        e.g. for the local mock VCO of the benchmarks.
+        """
+        m = re.match(r"(https?)://", hostname)
+        if m:
+            return m.group(1) + "://" + hostname[m.end():].rstrip("/")
+        return "https://" + hostname
+
+    def _cache_key(self, method, params):
+        """
+        Returns the cache key and TTL of the given call, or (None, 0) if it must not be cached
+        """
+        if self.cache is None:
+            return None, 0
+        ttl = self.cache.ttl(method)
+        if not ttl:
+            return None, 0
+        return self.cache.key(self._hostname, method, params, self._identity()), ttl
+
+    def _identity(self):
+        """
+        Who the calls are made as: a hash of the token or else of the session cookie, so different logins never share cached results
+        """
+        secret = self._token or self._session_cookie() or ""
+        return hashlib.sha256(secret.encode()).hexdigest()[:32]
+
+    def _build_payload(self, method, params):
+        """
+        Build a JSON-RPC 2.0 request object with a new sequence number
+        """
+        with self._seqno_lock:
+            self._seqno += 1
+            seqno = self._seqno
+        return { "jsonrpc": "2.0",
+                 "id": seqno,
+                 "method": method,
+                 "params": params }
+
+    def _get_url(self, method):
+        """
+        Live mode methods are served by the livepull url, everything else by the portal url
+        """
+        if method in ("liveMode/readLiveData", "liveMode/requestLiveActions", "liveMode/clientExitLiveMode"):
+            return self._livepull_url
+        return self._portal_url
+
+    def _clean_method_name(self, raw_name):
+        """
+        Ensure method name is properly formatted prior to initiating request
+        """
+        return raw_name.strip("/")
+
+    def _del_cookie(self):
+        """
+        Delete VCO session cookie
+        """
+        try: 
+           os.remove(self._store_cookie)
+           return True
+        except Exception as e:
+           raise ApiException(str(e))
+
+class VcoRequestManager(VcoRequestBase):
+
+    #TODO: Give path outside here for the user to alter
+    def __init__(self, hostname, verify_ssl=os.getenv('VCO_VERIFY_SSL', False), path=os.getenv('VCO_COOKIE_PATH', "/tmp/"), token=os.getenv('VCO_TOKEN',""), batch_size=os.getenv('VCO_BATCH_SIZE', 100), pool_size=os.getenv('VCO_WORKERS', 4), cache=None, timings=None, retries=os.getenv('VCO_RETRIES', 4)):
+        """
+        Init the Class. cache is an optional VcoResponseCache object used by call_api and call_batch.
+        timings is an optional VcoTimings object collecting the time spent per phase.
+        Reading methods are retried up to retries times on throttling, connection errors or non JSON responses.
+        """
         if not hostname:
             raise ApiException("Hostname not defined")
+        requests, InsecureRequestWarning = load_requests()
         self._session = requests.Session()
+        # One connection per worker thread sharing this session
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(int(pool_size), 1))
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
         self._token = token
         if len(self._token) > 0 :
             self._session.headers.update({"Authorization": f"Token {self._token}"})
         self._verify_ssl = verify_ssl
         if self._verify_ssl == False:
             requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+        self._hostname = hostname
+        self.cache = cache
+        self.timings = timings if timings is not None else VcoTimings()
         self._root_url = self._get_root_url(hostname)
         self._portal_url = self._root_url + "/portal/"
         self._livepull_url = self._root_url + "/livepull/liveData/"
-        self._store_cookie = path + hostname + ".txt"
+        self._store_cookie = path + re.sub(r"[/\\]", "_", hostname) + ".txt"
         self._seqno = 0
-
-    def _get_root_url(self, hostname):
-        """
-        Translate VCO hostname to a root url for API calls 
-        """
-        if hostname.startswith("http"):
-            re.sub('http(s)?://', '', hostname)
-        proto = "https://"
-        return proto + hostname
+        self._seqno_lock = threading.Lock()
+        self._batch_size = int(batch_size)
+        self._retries = max(int(retries), 0)
+        self.limit = VcoConcurrencyLimit(pool_size)
 
     def login(self, **kwargs):
         self.authenticate(**kwargs)
@@ -124,43 +1083,208 @@ class VcoRequestManager(object):
         Build and submit a request
         Returns method result as a Python dictionary
         """
-        if len(self._token) == 0:
-            if "velocloud.session" not in self._session.cookies: 
-                if not self._load_cookie():
-                    raise ApiException("Cannot load session cookie") 
+        self._check_session()
 
         if not method:
             raise ApiException("No Api Method defined")        
 
-        self._seqno += 1
         headers = { "Content-Type": "application/json" }
         method = self._clean_method_name(method)
-        payload = { "jsonrpc": "2.0",
-                    "id": self._seqno,
-                    "method": method,
-                    "params": params }
 
-        #print(payload)
-        if method in ("liveMode/readLiveData", "liveMode/requestLiveActions", "liveMode/clientExitLiveMode"):
-            url = self._livepull_url
-        else:
-            url = self._portal_url
+        key, ttl = self._cache_key(method, params)
+        if key:
+            with self.timings.phase("cache"):
+                found, result = self.cache.get(key)
+            if found:
+                return result
 
-        r = self._session.post(url, headers=headers,
-                               data=json.dumps(payload), verify=self._verify_ssl)
+        payload = self._build_payload(method, params)
 
-        response_dict = r.json()
+        #print(payload)
+        response_dict = self._post(self._get_url(method), headers, payload, is_idempotent(method))
         #print(response_dict)
         if "error" in response_dict:
             raise ApiException(response_dict["error"]["message"])
+        if key:
+            with self.timings.phase("cache"):
+                self.cache.put(key, method, response_dict["result"], ttl)
         return response_dict["result"]
 
-    def _clean_method_name(self, raw_name):
+    def call_batch(self, calls=None, batch_size=None, raise_on_error=False, *args, **kwargs):
         """
-        Ensure method name is properly formatted prior to initiating request
+        Build and submit JSON-RPC 2.0 batch requests for a list of (method, params) tuples
+        Returns the results in the same order as the calls. A failed call is returned as ApiException
+        object, unless raise_on_error is set. Batches are split at batch_size calls per request.
         """
-        return raw_name.strip("/")
-    
+        self._check_session()
+
+        if not calls:
+            raise ApiException("No Api Methods defined")
+
+        batch_size = int(batch_size or self._batch_size)
+        if batch_size < 1:
+            raise ApiException("Batch size must be at least 1")
+
+        # Live mode methods are served by a different url, hence group the calls per url first
+        results = [None] * len(calls)
+        keys = {}
+        groups = {}
+        for pos, (method, params) in enumerate(calls):
+            if not method:
+                raise ApiException("No Api Method defined")
+            method = self._clean_method_name(method)
+            key, ttl = self._cache_key(method, params)
+            if key:
+                with self.timings.phase("cache"):
+                    found, results[pos] = self.cache.get(key)
+                if found:
+                    continue
+                keys[pos] = (key, method, ttl)
+            groups.setdefault(self._get_url(method), []).append((pos, method, params))
+
+        headers = { "Content-Type": "application/json" }
+        for url, group in groups.items():
+            for i in range(0, len(group), batch_size):
+                chunk = group[i:i + batch_size]
+                ids = {}
+                payload = []
+                for pos, method, params in chunk:
+                    p = self._build_payload(method, params)
+                    ids[p["id"]] = pos
+                    payload.append(p)
+
+                response = self._post(url, headers, payload, all(is_idempotent(m) for _, m, _ in chunk))
+                # A single error object is returned if the batch as a whole got rejected
+                if isinstance(response, dict):
+                    if "error" in response:
+                        raise ApiException(response["error"]["message"])
+                    response = [response]
+
+                for item in response:
+                    if item.get("id") not in ids:
+                        continue
+                    pos = ids.pop(item["id"])
+                    if "error" in item:
+                        results[pos] = ApiException(item["error"]["message"])
+                    else:
+                        results[pos] = item.get("result")
+                        if pos in keys:
+                            key, method, ttl = keys[pos]
+                            with self.timings.phase("cache"):
+                                self.cache.put(key, method, results[pos], ttl)
+
+                for pos in ids.values():
+                    results[pos] = ApiException("No response received for method {}".format(calls[pos][0]))
+
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, ApiException):
+                    raise result
+        return results
+
+    def call_api_stream(self, method=None, params=None, chunk_size=65536, *args, **kwargs):
+        """
+        Build and submit a request, decoding the response while it is received
+        Yields the entries of the method result one by one, so memory stays flat no matter how large the result is
+        """
+        self._check_session()
+
+        if not method:
+            raise ApiException("No Api Method defined")
+
+        headers = { "Content-Type": "application/json" }
+        method = self._clean_method_name(method)
+        payload = self._build_payload(method, params)
+
+        t = time.perf_counter()
+        received = [0]
+        def chunks(r):
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                received[0] += len(chunk)
+                yield chunk
+
+        # Receiving and decoding overlap, hence both are measured as one phase
+        try:
+            with self._session.post(self._get_url(method), headers=headers, stream=True,
+                                    data=json.dumps(payload), verify=self._verify_ssl) as r:
+                if r.status_code != 200:
+                    raise ApiException(r.text)
+                yield from iter_json_result(chunks(r))
+        finally:
+            self.timings.add("stream", time.perf_counter() - t, received[0])
+
+    def reauthenticate(self, username=os.getenv('VCO_USER', None), password=os.getenv('VCO_PASS', "")):
+        """
+        Logs in again, e.g. once the session expired during a long job, as operator or else as enterprise user.
+        Returns False if no credentials are given (by default VCO_USER and VCO_PASS) or a token is used.
+        """
+        if len(self._token) > 0 or not username or not password:
+            return False
+        for is_operator in (True, False):
+            try:
+                self.authenticate(username, password, is_operator=is_operator)
+                return True
+            except ApiException:
+                continue
+        return False
+
+    def _post(self, url, headers, payload, retry=False):
+        """
+        Posts the JSON-RPC payload within the adaptive concurrency limit and returns the decoded response.
+        If retry is set, throttling, connection errors and non JSON responses are retried with backoff.
+        """
+        requests, InsecureRequestWarning = load_requests()
+        data = json.dumps(payload)
+        attempt = 0
+        while True:
+            retry_after = None
+            with self.limit:
+                t = time.perf_counter()
+                try:
+                    r = self._session.post(url, headers=headers, data=data, verify=self._verify_ssl)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    self.limit.update(time.perf_counter() - t, throttled=True)
+                    error = ApiException(str(e))
+                else:
+                    latency = time.perf_counter() - t
+                    self.timings.add("http", latency, len(r.content))
+                    self.limit.update(latency, throttled=r.status_code in (429, 503))
+                    error = None
+                    if r.status_code in retry_status:
+                        retry_after = r.headers.get("Retry-After")
+                        error = ApiException("HTTP {}: {}".format(r.status_code, r.text[:200]))
+                    else:
+                        try:
+                            with self.timings.phase("decode"):
+                                return r.json()
+                        except ValueError:
+                            # e.g. an error page of a proxy
+                            error = ApiException("HTTP {}: no JSON response: {}".format(r.status_code, r.text[:200]))
+            if not retry or attempt >= self._retries:
+                raise error
+            delay = retry_delay(attempt, retry_after)
+            self.timings.add("backoff", delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def _check_session(self):
+        """
+        Ensure a session cookie is present, if no token is used
+        """
+        if len(self._token) == 0:
+            if "velocloud.session" not in self._session.cookies: 
+                if not self._load_cookie():
+                    raise ApiException("Cannot load session cookie") 
+
+    def _session_cookie(self):
+        """
+        Returns the value of the session cookie, None if not logged in
+        """
+        for c in self._session.cookies:
+            if c.name == "velocloud.session":
+                return c.value
+        return None
+
     def _save_cookie(self):
         """
         Save cookie from VCO
@@ -178,23 +1302,403 @@ class VcoRequestManager(object):
         if not os.path.isfile(self._store_cookie):
             return False
         
-        with open(self._store_cookie, "rb") as f:
+        with self.timings.phase("cookie"), open(self._store_cookie, "rb") as f:
             try:
                self._session.cookies.update(pickle.load(f))
                return True
             except Exception as e:
                raise ApiException(str(e)) 	
 
-    def _del_cookie(self):
+class AsyncVcoRequestManager(VcoRequestBase):
+    """
+    asyncio version of VcoRequestManager based on aiohttp, to drive thousands of JSON-RPC calls from one event loop.
+    Login, cookie file, token and livepull url are handled the same way, so a login of vcoclient.py is used as well.
+    At most concurrency requests are in flight, every request is aborted after timeout seconds and cancelling a
+    call (e.g. via asyncio.wait_for) aborts its request.
+
+        async with AsyncVcoRequestManager(hostname, concurrency=200) as client:
+            edges = await client.call_api("enterprise/getEnterpriseEdges", {"enterpriseId": 1})
+    """
+    def __init__(self, hostname, verify_ssl=os.getenv('VCO_VERIFY_SSL', False), path=os.getenv('VCO_COOKIE_PATH', "/tmp/"), token=os.getenv('VCO_TOKEN',""), batch_size=os.getenv('VCO_BATCH_SIZE', 100), concurrency=os.getenv('VCO_WORKERS', 4), timeout=300, cache=None, timings=None, retries=os.getenv('VCO_RETRIES', 4)):
         """
-        Delete VCO session cookie
+        Init the Class. The aiohttp session is only created within the event loop, on first use.
         """
-        try: 
-           os.remove(self._store_cookie)
-           return True
-        except Exception as e:
-           raise ApiException(str(e))
+        if not hostname:
+            raise ApiException("Hostname not defined")
+        self._token = token
+        self._verify_ssl = verify_ssl
+        self._hostname = hostname
+        self.cache = cache
+        self.timings = timings if timings is not None else VcoTimings()
+        self._root_url = self._get_root_url(hostname)
+        self._portal_url = self._root_url + "/portal/"
+        self._livepull_url = self._root_url + "/livepull/liveData/"
+        self._store_cookie = path + re.sub(r"[/\\]", "_", hostname) + ".txt"
+        self._seqno = 0
+        self._seqno_lock = threading.Lock()
+        self._batch_size = int(batch_size)
+        self._concurrency = max(int(concurrency), 1)
+        self._timeout = timeout
+        self._retries = max(int(retries), 0)
+        self._cookies = {}
+        self._session = None
+        self._semaphore = None
 
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """
+        Closes the session and its connections
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        """
+        Returns the aiohttp session, created on first use within the running event loop
+        """
+        import asyncio
+        if self._session is None:
+            try:
+                import aiohttp
+            except ImportError:
+                raise ApiException("AsyncVcoRequestManager needs aiohttp, install it via 'pip3 install vcoclient[async]'")
+            headers = { "Content-Type": "application/json" }
+            if len(self._token) > 0:
+                headers["Authorization"] = f"Token {self._token}"
+            connector = aiohttp.TCPConnector(limit=self._concurrency, ssl=None if self._verify_ssl else False)
+            self._session = aiohttp.ClientSession(connector=connector, headers=headers,
+                                                  timeout=aiohttp.ClientTimeout(total=self._timeout))
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        return self._session
+
+    async def login(self, **kwargs):
+        await self.authenticate(**kwargs)
+
+    async def logout(self, **kwargs):
+        await self.authenticate(logout=True, **kwargs)
+
+    async def authenticate(self, username="", password="", logout=False, is_operator=True, *args, **kwargs):
+        """
+        Authenticate to API - on success, the session cookie is kept and stored in the same file as by VcoRequestManager
+        """
+        if len(self._token) > 0:
+            return
+
+        if not logout:
+            path = "/login/operatorLogin" if is_operator else "/login/enterpriseLogin"
+            data = { "username": username, "password": password }
+        else:
+            self._check_session()
+            path = "/logout"
+            data = {}
+
+        async with self._get_session().post(self._root_url + path, data=json.dumps(data), cookies=self._cookies) as r:
+            await r.read()
+            if r.status != 200:
+                raise ApiException(await r.text())
+            cookies = {k: v.value for k, v in r.cookies.items()}
+
+        if logout:
+            self._cookies = {}
+            self._del_cookie()
+            return
+        if "Invalid" in cookies.get("velocloud.message", ""):
+            raise ApiException(cookies["velocloud.message"].replace("%20", " "))
+        if "velocloud.session" not in cookies:
+            raise ApiException("Cookie not received by server - something is very wrong")
+        self._cookies = {"velocloud.session": cookies["velocloud.session"]}
+        self._save_cookie()
+
+    async def reauthenticate(self, username=os.getenv('VCO_USER', None), password=os.getenv('VCO_PASS', "")):
+        """
+        Logs in again, e.g. once the session expired during a long job, as operator or else as enterprise user.
+        Returns False if no credentials are given (by default VCO_USER and VCO_PASS) or a token is used.
+        """
+        if len(self._token) > 0 or not username or not password:
+            return False
+        for is_operator in (True, False):
+            try:
+                await self.authenticate(username, password, is_operator=is_operator)
+                return True
+            except ApiException:
+                continue
+        return False
+
+    async def call_api(self, method=None, params=None, timeout=None, *args, **kwargs):
+        """
+        Build and submit a request, waiting for a free slot of the concurrency limit first
+        Returns method result as a Python dictionary
+        """
+        self._check_session()
+
+        if not method:
+            raise ApiException("No Api Method defined")
+        method = self._clean_method_name(method)
+
+        key, ttl = self._cache_key(method, params)
+        if key:
+            with self.timings.phase("cache"):
+                found, result = self.cache.get(key)
+            if found:
+                return result
+
+        response = await self._post(self._get_url(method), self._build_payload(method, params), timeout, is_idempotent(method))
+        if not isinstance(response, dict):
+            raise ApiException("Unexpected response for method {}".format(method))
+        if "error" in response:
+            raise ApiException(response["error"]["message"])
+        if key:
+            with self.timings.phase("cache"):
+                self.cache.put(key, method, response["result"], ttl)
+        return response["result"]
+
+    async def call_batch(self, calls=None, batch_size=None, raise_on_error=False, timeout=None, *args, **kwargs):
+        """
+        Build and submit JSON-RPC 2.0 batch requests for a list of (method, params) tuples, all batches concurrently
+        Returns the results in the same order as the calls. A failed call (or batch) is returned as ApiException
+        object, unless raise_on_error is set.
+        """
+        import asyncio
+        self._check_session()
+
+        if not calls:
+            raise ApiException("No Api Methods defined")
+
+        batch_size = int(batch_size or self._batch_size)
+        if batch_size < 1:
+            raise ApiException("Batch size must be at least 1")
+
+        results = [None] * len(calls)
+        keys = {}
+        groups = {}
+        for pos, (method, params) in enumerate(calls):
+            if not method:
+                raise ApiException("No Api Method defined")
+            method = self._clean_method_name(method)
+            key, ttl = self._cache_key(method, params)
+            if key:
+                with self.timings.phase("cache"):
+                    found, results[pos] = self.cache.get(key)
+                if found:
+                    continue
+                keys[pos] = (key, method, ttl)
+            groups.setdefault(self._get_url(method), []).append((pos, method, params))
+
+        async def send(url, chunk):
+            ids = {}
+            payload = []
+            for pos, method, params in chunk:
+                p = self._build_payload(method, params)
+                ids[p["id"]] = pos
+                payload.append(p)
+            try:
+                response = await self._post(url, payload, timeout, all(is_idempotent(m) for _, m, _ in chunk))
+            except ApiException as e:
+                for pos in ids.values():
+                    results[pos] = e
+                return
+            # A single error object is returned if the batch as a whole got rejected
+            if isinstance(response, dict):
+                if "error" in response:
+                    for pos in ids.values():
+                        results[pos] = ApiException(response["error"]["message"])
+                    return
+                response = [response]
+            for item in response:
+                if item.get("id") not in ids:
+                    continue
+                pos = ids.pop(item["id"])
+                if "error" in item:
+                    results[pos] = ApiException(item["error"]["message"])
+                else:
+                    results[pos] = item.get("result")
+                    if pos in keys:
+                        key, method, ttl = keys[pos]
+                        with self.timings.phase("cache"):
+                            self.cache.put(key, method, results[pos], ttl)
+            for pos in ids.values():
+                results[pos] = ApiException("No response received for method {}".format(calls[pos][0]))
+
+        await asyncio.gather(*[send(url, group[i:i + batch_size])
+                               for url, group in groups.items() for i in range(0, len(group), batch_size)])
+
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, ApiException):
+                    raise result
+        return results
+
+    async def call_api_stream(self, *args, **kwargs):
+        raise ApiException("Streaming is not supported by AsyncVcoRequestManager")
+
+    async def _post(self, url, payload, timeout=None, retry=False):
+        """
+        Posts the JSON-RPC payload within the concurrency limit, returns the decoded response.
+        If retry is set, throttling, connection errors, timeouts and non JSON responses are retried with backoff.
+        """
+        import asyncio
+        session = self._get_session()
+        data = json.dumps(payload)
+        kwargs = {"timeout": type(session.timeout)(total=timeout)} if timeout else {}
+        attempt = 0
+        while True:
+            retry_after = None
+            async with self._semaphore:
+                t = time.perf_counter()
+                try:
+                    async with session.post(url, data=data, cookies=self._cookies, **kwargs) as r:
+                        body = await r.read()
+                        self.timings.add("http", time.perf_counter() - t, len(body))
+                        status, retry_after = r.status, r.headers.get("Retry-After")
+                except asyncio.TimeoutError:
+                    status, body = None, "Timeout after {} seconds".format(timeout or self._timeout).encode()
+                except OSError as e:
+                    status, body = None, str(e).encode()
+            if status is None or status in retry_status:
+                error = ApiException(body.decode(errors="replace") if status is None else "HTTP {}: {}".format(status, body[:200].decode(errors="replace")))
+            else:
+                try:
+                    with self.timings.phase("decode"):
+                        return json.loads(body)
+                except ValueError:
+                    error = ApiException("HTTP {}: no JSON response: {}".format(status, body[:200].decode(errors="replace")))
+            if not retry or attempt >= self._retries:
+                raise error
+            delay = retry_delay(attempt, retry_after)
+            self.timings.add("backoff", delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _check_session(self):
+        """
+        Ensure a session cookie is present, if no token is used
+        """
+        if len(self._token) == 0 and "velocloud.session" not in self._cookies:
+            if not self._load_cookie():
+                raise ApiException("Cannot load session cookie")
+
+    def _session_cookie(self):
+        """
+        Returns the value of the session cookie, None if not logged in
+        """
+        return self._cookies.get("velocloud.session")
+
+    def _save_cookie(self):
+        """
+        Save cookie in the same format as VcoRequestManager, so both share one login
+        """
+        requests, InsecureRequestWarning = load_requests()
+        jar = requests.cookies.RequestsCookieJar()
+        for k, v in self._cookies.items():
+            jar.set(k, v)
+        with open(self._store_cookie, "wb") as f:
+            try:
+                pickle.dump(jar, f)
+            except Exception as e:
+                raise ApiException(str(e))
+
+    def _load_cookie(self):
+        """
+        Load VCO session cookie, as stored by VcoRequestManager or this class
+        """
+        if not os.path.isfile(self._store_cookie):
+            return False
+
+        with self.timings.phase("cookie"), open(self._store_cookie, "rb") as f:
+            try:
+                jar = pickle.load(f)
+            except Exception as e:
+                raise ApiException(str(e))
+        cookies = {c.name: c.value for c in jar} if not isinstance(jar, dict) else jar
+        if "velocloud.session" not in cookies:
+            return False
+        self._cookies = {"velocloud.session": cookies["velocloud.session"]}
+        return True
+
+class VcoFlatIndex(object):
+    """
+    Columnar (row, path, value) index over all leaves of a list of entries, built once in one pass and used for
+    searching values. Paths are joined by "_", e.g. "site_name" or "recentLinks_0_interface".
+    """
+    def __init__(self, rows):
+        self.prefixes = []
+        self.rows     = []
+        self.parents  = []
+        self.keys     = []
+        self.values   = []
+        for i, row in enumerate(rows):
+            self.__add(i, row, "")
+        self._haystack = None
+        self._starts   = None
+
+    def __add(self, i, x, prefix):
+        """
+        Adds all leaves of x. The path of each container is stored once instead of once per leaf.
+        """
+        pid = len(self.prefixes)
+        self.prefixes.append(prefix)
+        items = x.items() if isinstance(x, dict) else enumerate(x) if isinstance(x, list) else ((None, x),)
+        for k, v in items:
+            if isinstance(v, (dict, list)):
+                self.__add(i, v, prefix + str(k) + "_")
+            else:
+                self.rows.append(i)
+                self.parents.append(pid)
+                self.keys.append(k)
+                self.values.append(v)
+
+    def __build_haystack(self):
+        """
+        Upper cases and joins all values once, so one compiled pattern can scan all of them in a single pass
+        """
+        import numpy as np
+        strs = list(map(str, self.values))
+        haystack = "\0".join(strs)
+        upper = haystack.upper()
+        # Upper casing might change the length of some characters, then offsets must be based on the upper cased values
+        if len(upper) != len(haystack):
+            strs = [x.upper() for x in strs]
+            upper = "\0".join(strs)
+        lengths = np.fromiter(map(len, strs), dtype=np.int64, count=len(strs)) + 1
+        self._starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        self._haystack = upper
+
+    def path(self, leaf):
+        """
+        Returns the path of the given leaf
+        """
+        k = self.keys[leaf]
+        prefix = self.prefixes[self.parents[leaf]]
+        return prefix[:-1] if k is None else prefix + str(k)
+
+    def match(self, search):
+        """
+        Returns the positions of all leaves containing any of the given values seperated by | (case insensitive), or all on "*"
+        """
+        terms = search.split("|")
+        if search == "*" or "" in terms:
+            return list(range(len(self.values)))
+        if not self.values:
+            return []
+
+        import numpy as np
+        if self._haystack is None:
+            self.__build_haystack()
+        pattern = re.compile("|".join(re.escape(t.upper()) for t in terms))
+        found = np.fromiter((m.start() for m in pattern.finditer(self._haystack)), dtype=np.int64)
+        return np.unique(np.searchsorted(self._starts, found, side="right") - 1).tolist()
+
+    def search(self, search):
+        """
+        Returns a list of (row, path, value) of all leaves matching the search
+        """
+        return [(self.rows[i], self.path(i), self.values[i]) for i in self.match(search)]
 
 class VcoApiExecuteError(Exception):
    pass
@@ -208,52 +1712,220 @@ class VcoApiExecute(object):
             raise VcoApiExecuteError("Dest not defined in argparse object")        
         name        = args["dest"]
         self.url    = config[name]["url"]
-        self.param  = self.__replace_placeholder(config[name]["param"], **args)
-        self.call   = config[name]["call"]
-        self.out    = config[name]["mani"]
-        self.client = VcoRequestManager(args["hostname"])
         self.p      = None
+        self.result = None
+        # Scopes (e.g. enterpriseId or vco) which failed, while the call as a whole succeeded
+        self.failed = []
+        vcos = vco_list(args.get("hostname"))
+        if len(vcos) > 1:
+            self.out     = None if args.get("raw") else config[name]["mani"]
+            self.client  = None
+            self.cache   = None
+            self.timings = VcoTimings()
+            if args.get("stream"):
+                print("stream: not supported with several VCOs, their results are merged first", file=sys.stderr)
+            self.__federate(vcos, **args)
+            return
+        # A given client (e.g. of a script run) shares its session, connections and cache over several calls
+        if args.get("client") is None and args.get("sessions") is not None:
+            args["client"] = args["sessions"](vcos[0])
+        if args.get("client") is not None:
+            self.client = args["client"]
+            self.cache  = self.client.cache
+        else:
+            self.cache  = VcoResponseCache(ttl=args.get("cache_ttl")) if args.get("cache") and config[name]["call"] == "call_api" else None
+            self.client = VcoRequestManager(vcos[0], pool_size=args.get("workers") or 1, cache=self.cache, retries=args.get("retries") or 0)
+        self.clients = [self.client]
+        self.timings = self.client.timings
+        self.ids    = self.__get_ids(args.get("enterpriseid"))
+        if len(self.ids) > 1:
+            params = [self.__replace_placeholder(config[name]["param"], **dict(args, enterpriseid=i)) for i in self.ids]
+        else:
+            if self.ids:
+                args["enterpriseid"] = self.ids[0]
+            params = [self.__replace_placeholder(config[name]["param"], **args)]
+        # Only what --filters can select is asked for, unless the whole result is kept (raw or diffed) or searched,
+        # as --search matches --filters against the paths within lists too (e.g. recentLinks_0_interface)
+        if args.get("filters") and config[name]["call"] == "call_api" and config[name]["mani"] == "format_by_name" and not (args.get("raw") or args.get("diff_against") or args.get("search")):
+            params = [project_params(p, args["filters"], args.get("percentiles") if args.get("rollup") else None) for p in params]
+        if args.get("slice") and args.get("rollup"):
+            raise VcoApiExecuteError("--slice and --rollup cannot be combined, the rollup fetches its buckets as windows already")
+        self.rollup = args.get("rollup")
+        self.windows = self.__get_windows(params[0], args.get("slice") or self.rollup)
+        if len(params) > 1 or len(self.windows) > 1 or self.rollup:
+            self.param = [dict(p, interval=w) if w else p for p in params for w in self.windows]
+        else:
+            self.param = params[0]
+        self.call   = config[name]["call"]
+        # Only the result is needed, e.g. when stored by a script, hence no need to format it
+        self.out    = None if args.get("raw") else config[name]["mani"]
+
+        self.__internal_call(**args)
+
+    @classmethod
+    async def execute_async(cls, **args):
+        """
+        Awaitable version for asyncio applications, e.g. obj = await VcoApiExecute.execute_async(**vars(args)).
+        The call is executed in a worker thread, so the event loop keeps running meanwhile.
+        """
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: cls(**args))
+
+    def __federate(self, vcos, **args):
+        """
+        Executes the call on several VCOs concurrently, each one with its own session, and merges the results into
+        one list tagged with the vco. name, filters, search and stats are applied to the merged result.
+        Errors of single VCOs are reported but do not fail the whole call.
+        """
+        def execute(vco):
+            sub = dict(args, hostname=vco, client=None, raw=True, stream=False, diff_against=None)
+            # Every VCO gets its own journal, as the results are appended concurrently
+            if args.get("checkpoint"):
+                sub["checkpoint"] = os.path.join(args["checkpoint"], vco.replace("/", "_"))
+            try:
+                return VcoApiExecute(**sub)
+            except (ApiException, VcoApiExecuteError) as e:
+                return e
+
+        # Each VCO runs within a copy of the context, e.g. to write to the stderr of a command forwarded to the daemon
+        with concurrent.futures.ThreadPoolExecutor(len(vcos)) as pool:
+            executed = [f.result() for f in [pool.submit(contextvars.copy_context().run, execute, vco) for vco in vcos]]
+        self.clients = [x.client for x in executed if isinstance(x, VcoApiExecute)]
+
+        merged = []
+        errors = []
+        for vco, x in zip(vcos, executed):
+            if not isinstance(x, VcoApiExecute):
+                errors.append(x)
+                self.failed.append({"vco": vco})
+                print("vco {}: {}".format(vco, x), file=sys.stderr)
+                continue
+            self.failed.extend(dict(scope, vco=vco) for scope in x.failed)
+            result = x.result if isinstance(x.result, list) else [x.result] if x.result else []
+            # Shallow copies, as the results may still be held by the in-memory cache
+            merged.extend(dict(entry, vco=vco) if isinstance(entry, dict) else entry for entry in result)
+        if errors and len(errors) == len(vcos):
+            raise errors[0]
+
+        self.__output(merged, **args)
+
+    @staticmethod
+    def __label_duplicates(j, scope="vco"):
+        """
+        Labels entries of the same name in several scopes, e.g. the same customer on several VCOs as <vco>:<name>
+        or the same gateway of several enterprises as <enterpriseId>:<name>
+        """
+        names = {}
+        for entry in j:
+            if isinstance(entry, dict) and "name" in entry and scope in entry:
+                names.setdefault(entry["name"], set()).add(entry[scope])
+        for i, entry in enumerate(j):
+            if isinstance(entry, dict) and len(names.get(entry.get("name"), ())) > 1:
+                j[i] = dict(entry, name="{}:{}".format(entry[scope], entry["name"]))
 
-        self.__internal_call(**args)
+    def __output(self, o, diff_against=None, **args):
+        """
+        Keeps the result, diffed against the given snapshot if any, and formats it unless raw
+        """
+        if diff_against:
+            with self.timings.phase("diff"):
+                snapshot = VcoSnapshot(diff_against)
+                o, entries = snapshot.diff(o, self.failed)
+                snapshot.save(entries)
+        # Only after diffing, as the labels depend on the VCOs and enterprises given
+        if isinstance(o, list) and len(getattr(self, "ids", ())) > 1:
+            self.__label_duplicates(o, "enterpriseId")
+        if self.client is None and isinstance(o, list):
+            self.__label_duplicates(o)
+        o = self.result = o
+        if self.out and o:
+            self.p = getattr(self, self.out)(o, **args)
 
     def __internal_call(self, **args):
         """
         Uses VcoRequestManager object and associated config dicts to execute the APIs.
         """
         try:
-            if self.call:
+            if args.get("from_store"):
+                self.__output(self.query_store(**args), **args)
+            elif self.call and not hasattr(self.client, self.call):
+                self.__output(getattr(self, self.call)(**args), **args)
+            elif self.call == "call_api" and args.get("checkpoint"):
+                params = self.param if isinstance(self.param, list) else [self.param]
+                results = self.__merge_windows(self.__checkpointed([(self.url, p) for p in params], **args), **args)
+                if isinstance(self.param, list):
+                    self.__output(self.__merge_results(self.ids if len(self.ids) > 1 else [None], results), **args)
+                elif isinstance(results[0], ApiException):
+                    raise results[0]
+                else:
+                    self.__output(results[0], **args)
+            elif self.call == "call_api" and args.get("stream") and args.get("output") == "ndjson" and len(self.windows) == 1 and not (args.get("diff_against") or self.rollup):
+                self.__stream(**args)
+            elif self.call and isinstance(self.param, list):
+                results = self.__merge_windows(self.__fan_out(None, **args), **args)
+                self.__output(self.__merge_results(self.ids if len(self.ids) > 1 else [None], results), **args)
+            elif self.call:
                 args["method"] = self.url
                 args["params"] = self.param
-                o = getattr(self.client, self.call)(**args)
-                if self.out and o:
-                    self.p = getattr(self, self.out)(o, **args)
+                self.__output(getattr(self.client, self.call)(**args), **args)
         except Exception as e:
             if type(e).__name__ != "ApiException":
                 raise VcoApiExecuteError(str(e))
             raise e
 
-    def format_by_name(self, j, name=None, search=None, filters=None, output=None, rows=None, stats=None, transpose=None, **args):
+    def format_by_name(self, j, name=None, search=None, filters=None, output=None, rows=None, stats=None, transpose=None, max_memory=None, **args):
         """
         Converting JSON into Panda dataframe for filtering/searching given keys/values from that datastructure. 
         """
-        df  = pd.DataFrame.from_dict(pd.json_normalize(j, sep='_'), orient='columns')
-        df.rename(index=df.name.to_dict(), inplace=True)
+        if output == "json" and not (name or search or filters or stats or rows):
+            with self.timings.phase("output"):
+                o = self.__format_json(j, transpose)
+            if o is not None:
+                self.timings.set("rows", len(j))
+                return o
+
+        if output == "ndjson":
+            if stats:
+                raise VcoApiExecuteError("Stats are not supported with ndjson output")
+            if not isinstance(j, list):
+                j = [j]
+            with self.timings.phase("output"):
+                merged = len({x.get("enterpriseId") for x in j if isinstance(x, dict)}) > 1
+                records = [r for r in (self.format_record(x, name, search, filters, merged) for x in j) if r is not None]
+                o = "\n".join(json.dumps(r, default=str) for r in records)
+            self.timings.set("rows", len(records))
+            return o
+
+        with self.timings.phase("pandas"):
+            pd, np = load_pandas()
+        # On search the dataframe is built out of the found values only, hence no need to normalize all of j
+        if not search:
+            with self.timings.phase("normalize"):
+                # describe() needs the original dtypes, e.g. it breaks ties of the most frequent value differently for categoricals
+                df  = self.__build_frame(j, filters, max_memory, compact_floats=not stats, categories=not stats)
 
         found = 1 
         if search:
-            expand = {}
-            for k,v in self.__search_value(j, search):
-                i, *_ = k.split("_")
-                n = j[int(i)]["name"]
-                k = k[len(i)+1:]
-                expand.setdefault(n,{})
-                expand[n].setdefault(k,{})
-                expand[n]["name"] = n 
-                expand[n][k] = v
-
-          # TODO: Not sure what is more efficient, ...(found).T or ...from_dict(found, orient='index'). Fact is, from_dict does not preserve order, hence using .T for now.
-            found = bool(expand)
-            df = pd.DataFrame(expand).T
+            with self.timings.phase("search"):
+                expand = {}
+                entries = j if isinstance(j, list) else [j]
+                merged = len({x.get("enterpriseId") for x in entries if isinstance(x, dict)}) > 1
+                for i,k,v in VcoFlatIndex(entries).search(search):
+                    n = entries[i]["name"]
+                    expand.setdefault(i,{})
+                    expand[i].setdefault(k,{})
+                    expand[i]["name"] = n 
+                    expand[i][k] = v
+                    # Found values of a federated call keep the VCO they were found on, of several enterprises the enterprise
+                    if "vco" in entries[i]:
+                        expand[i]["vco"] = entries[i]["vco"]
+                    if merged and "enterpriseId" in entries[i]:
+                        expand[i]["enterpriseId"] = entries[i]["enterpriseId"]
+                expand = {label: expand[i] for i, label in self.__search_labels(entries, expand).items()}
+
+              # TODO: Not sure what is more efficient, ...(found).T or ...from_dict(found, orient='index'). Fact is, from_dict does not preserve order, hence using .T for now.
+                found = bool(expand)
+                df = pd.DataFrame(expand).T
           
         if name and found:
             df = df[df['name'].str.contains(name)]
@@ -268,24 +1940,191 @@ class VcoApiExecute(object):
         if "name" in df:
             df.drop("name", axis=1, inplace=True)
 
-        df = df.T
-        df.fillna(value=np.nan, inplace=True)
-        df.dropna(axis='columns', how='all', inplace=True)
-
-        if not transpose:
-            df = df.T
+        # Entries without any value are dropped before transposing, as every transpose copies the whole frame as object
+        with self.timings.phase("transpose"):
+            df.dropna(axis='index', how='all', inplace=True)
+            # Columns downcast to different sizes of the same kind would otherwise end up as object
+            kinds = set(df.dtypes.map(lambda t: t.kind))
+            if kinds == {"i"}:
+                df = df.astype(np.int64)
+            elif kinds == {"f"}:
+                df = df.astype(np.float64)
+            if transpose:
+                df = df.T
+            elif output == "pandas" and not rows and len(set(df.dtypes)) > 1:
+                # Printed the same as after the former two transposes
+                df = df.astype(object)
+            df.fillna(value=np.nan, inplace=True)
+        self.timings.set("rows", df.shape[0])
+        self.timings.set("columns", df.shape[1])
 
         if rows:
             df = list(df.index)
 
-        if output == "json":
-            df = df.to_json()
-        elif output == "csv":
-            df = df.to_csv()
+        with self.timings.phase("output"):
+            if output == "json":
+                df = df.to_json()
+            elif output == "csv":
+                df = df.to_csv()
         
         return df
 
 
+    def __build_frame(self, j, filters=None, max_memory=None, compact_floats=True, categories=True):
+        """
+        Builds the dataframe of the given entries, one row per entry (named by its name) and one column per flattened key,
+        the same as json_normalize does but with compact dtypes. Only keys matching filters are materialized, and without
+        filters nested subtrees are left out (largest first) if the frame would exceed max_memory bytes otherwise.
+        """
+        pd, np = load_pandas()
+        entries = [x if isinstance(x, dict) else {} for x in (j if isinstance(j, list) else [j])]
+        pruned = self.__prune(entries, filters, max_memory) if max_memory else set()
+        pattern = re.compile(filters) if filters else None
+
+        columns = {}
+        for i, x in enumerate(entries):
+            if pruned:
+                x = {k: v for k, v in x.items() if k not in pruned}
+            for k, v in flatten_record(x).items():
+                if pattern and k != "name" and not pattern.search(k):
+                    continue
+                column = columns.get(k)
+                if column is None:
+                    column = columns[k] = [None] * len(entries)
+                column[i] = v
+
+        index = pd.Index(columns["name"]) if "name" in columns else None
+        return pd.DataFrame({k: compact_series(pd, np, v, index, compact_floats, categories and k != "name") for k, v in columns.items()}, index=index)
+
+    def __prune(self, entries, filters, max_memory):
+        """
+        Returns the top level keys of nested subtrees (e.g. configuration) to be left out, largest first, until the
+        estimated size of the dataframe fits into max_memory. Keys matching filters are always kept.
+        """
+        pattern = re.compile(filters) if filters else None
+
+        def size(v, path):
+            # Estimated bytes of the cells of one value once materialized, plus its text once output
+            if isinstance(v, dict):
+                return sum(size(x, path + "_" + str(k)) for k, x in v.items())
+            if pattern and path != "name" and not pattern.search(path):
+                return 0
+            return 16 + (len(v) if isinstance(v, str) else len(json.dumps(v, default=str)) if isinstance(v, (list, tuple)) else 8)
+
+        sizes = {}
+        nested = set()
+        for x in entries:
+            for k, v in x.items():
+                sizes[k] = sizes.get(k, 0) + size(v, str(k))
+                if isinstance(v, dict):
+                    nested.add(k)
+        total = sum(sizes.values())
+
+        pruned = set()
+        if not pattern:
+            for k in sorted(nested, key=sizes.get, reverse=True):
+                if total <= max_memory:
+                    break
+                pruned.add(k)
+                total -= sizes[k]
+        if total > max_memory:
+            raise VcoApiExecuteError("The result needs about {:.1f} MB, more than --max-memory even without nested subtrees, narrow it down via --filters or --search".format(total / 2**20))
+        if pruned:
+            print("max-memory: left out {}".format(", ".join(sorted(pruned))), file=sys.stderr)
+            self.timings.set("pruned", sorted(pruned))
+        return pruned
+
+    @staticmethod
+    def __search_labels(entries, found):
+        """
+        Returns the column label per found entry: its name, or <enterpriseId>:<name> (else <index>:<name>) for names found more than once
+        """
+        def count(labels):
+            counts = {}
+            for l in labels.values():
+                counts[l] = counts.get(l, 0) + 1
+            return counts
+        labels = {i: str(entries[i]["name"]) for i in found}
+        counts = count(labels)
+        labels = {i: l if counts[l] == 1 else "{}:{}".format(entries[i].get("enterpriseId", i), l) for i, l in labels.items()}
+        counts = count(labels)
+        return {i: l if counts[l] == 1 else "{}:{}".format(i, entries[i]["name"]) for i, l in labels.items()}
+
+    def format_record(self, x, name=None, search=None, filters=None, merged=False):
+        """
+        Flattens one entry of the returned datastructure and applies name, search and filters on it.
+        Found values keep the vco and, if merged out of several enterprises, the enterpriseId of their entry.
+        Returns None if the entry does not match.
+        """
+        if not isinstance(x, dict):
+            return None
+        n = x.get("name")
+        if name and (n is None or not re.search(name, str(n))):
+            return None
+        if search:
+            r = {"name": n}
+            r.update((k, v) for _, k, v in VcoFlatIndex([x]).search(search))
+            if len(r) == 1:
+                return None
+            if "vco" in x:
+                r["vco"] = x["vco"]
+            if merged and "enterpriseId" in x:
+                r["enterpriseId"] = x["enterpriseId"]
+        else:
+            r = flatten_record(x)
+        if filters:
+            r = {k: v for k, v in r.items() if k == "name" or re.search(filters, k)}
+        return r
+
+    def __stream(self, name=None, search=None, filters=None, stats=None, **args):
+        """
+        Streams the result of the API call(s) entry by entry as ndjson to stdout
+        """
+        if stats:
+            raise VcoApiExecuteError("Stats are not supported with ndjson output")
+        params = self.param if isinstance(self.param, list) else [self.param]
+        ids = self.ids if len(self.ids) == len(params) else [None] * len(params)
+        for i, param in zip(ids, params):
+            try:
+                for x in self.client.call_api_stream(self.url, param):
+                    if i is not None and isinstance(x, dict):
+                        x.setdefault("enterpriseId", i)
+                    r = self.format_record(x, name, search, filters, len(set(self.ids)) > 1)
+                    if r is not None and not write_ndjson(r):
+                        return
+            except ApiException as e:
+                if len(params) == 1:
+                    raise e
+                print("enterpriseId {}: {}".format(i, e), file=sys.stderr)
+
+    @staticmethod
+    def __format_json(j, transpose=None):
+        """
+        Pure Python version of format_by_name for plain json output, without the need of importing pandas.
+        Returns None if the datastructure is not a list of uniquely named entries, so pandas can handle it instead.
+        """
+        if not isinstance(j, list) or not all(isinstance(x, dict) and "name" in x for x in j):
+            return None
+        # Rows are keyed by name, same names would overwrite each other
+        if len({str(x["name"]) for x in j}) != len(j):
+            return None
+
+        rows = {}
+        keys = {}
+        for x in j:
+            row = flatten_record(x)
+            n = str(row.pop("name"))
+            rows[n] = row
+            keys.update(dict.fromkeys(row))
+
+        # Same as dropna(axis='columns', how='all') on the transposed dataframe 
+        rows = {n: row for n, row in rows.items() if any(v is not None for v in row.values())}
+        if transpose:
+            out = {n: {k: row.get(k) for k in keys} for n, row in rows.items()}
+        else:
+            out = {k: {n: row.get(k) for n, row in rows.items()} for k in keys}
+        return json.dumps(out, separators=(",", ":"), default=str)
+
     @staticmethod 
     def __replace_placeholder (dic, **ph):
         """
@@ -305,27 +2144,751 @@ class VcoApiExecute(object):
             return {}
         return string_sub(dic)
 
+    def live_watch(self, edgeid=None, interval=None, duration=None, buffer=None, workers=None, name=None, search=None, filters=None, **args):
+        """
+        Writes the changed live datapoints of the given VCEs as ndjson to stdout, until duration is over or interrupted
+        """
+        watch = VcoLiveWatch(self.client, self.__get_edges(edgeid), interval=interval, duration=duration / 1000 if duration else None,
+                             buffer_size=buffer, workers=workers or 1)
+        # Live mode is exited within the iterator, also when being terminated
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            for x in watch:
+                r = self.format_record(x, name, search, filters)
+                if r is not None and not write_ndjson(r):
+                    break
+        except KeyboardInterrupt:
+            pass
+
+    def metrics_sync(self, hostname=None, edgeid=None, starttime=None, slice=None, store=None, **args):
+        """
+        Appends the link metrics of the given VCEs since their last sync, window by window, into the local metrics store.
+        Returns a summary per VCE.
+        """
+        store = VcoMetricsStore(store, hostname)
+        state = store.state()
+        # Only complete windows are synced, so the next sync continues exactly where this one ended
+        now = int(time.time() * 1000) // slice * slice
+        first = (starttime or now - 24 * 60 * 60 * 1000) // slice * slice
+        param = self.param[0] if isinstance(self.param, list) else self.param
+
+        edges = self.__get_edges(edgeid)
+        units = []
+        for e, d, n in edges:
+            for t in range(state.get(store.key(e, d), first), now, slice):
+                units.append((e, d, {"start": t, "end": t + slice}))
+        results = self.__fan_out([(self.url, dict(param, enterpriseId=e, edgeId=d, interval=w)) for e, d, w in units], **args)
+
+        per_edge = {}
+        for (e, d, w), result in zip(units, results):
+            per_edge.setdefault((e, d), []).append((w, result))
+
+        summary = []
+        for e, d, n in edges:
+            rows = []
+            windows = 0
+            error = None
+            for w, result in per_edge.get((e, d), []):
+                # The state only moves forward up to the first failed window
+                if isinstance(result, ApiException):
+                    error = str(result)
+                    break
+                for r in result:
+                    row = {k: v for k, v in flatten_record(r).items() if not isinstance(v, (list, dict))}
+                    row.update({"enterpriseId": e, "edgeId": d, "intervalStart": w["start"], "intervalEnd": w["end"]})
+                    rows.append(row)
+                windows += 1
+            start = state.get(store.key(e, d), first)
+            if windows:
+                store.append(e, d, rows)
+                state[store.key(e, d)] = start + windows * slice
+            summary.append({"name": n, "enterpriseId": e, "edgeId": d,
+                            "from": datetime.datetime.utcfromtimestamp(start / 1000).strftime("%Y-%m-%d %H:%M"),
+                            "to": datetime.datetime.utcfromtimestamp((start + windows * slice) / 1000).strftime("%Y-%m-%d %H:%M"),
+                            "windows": windows, "rows": len(rows), "error": error})
+            store.save_state(state)
+        return summary
+
+    def topology_build(self, hostname=None, db=None, full=False, **args):
+        """
+        Refreshes the local topology of the enterprises which changed since the last build (or all if full),
+        fetching their edges, gateways and the edges assigned to those gateways concurrently.
+        Returns a summary per refreshed or removed enterprise.
+        """
+        topology = VcoTopology(db, hostname)
+        customers = self.__get_customers()
+        if self.ids:
+            customers = [c for c in customers if c["id"] in self.ids]
+        known = topology.fingerprints()
+        # Only what the topology keeps, hence edges added, removed or of another edgeState change it, but not e.g. counters
+        fingerprints = {c["id"]: VcoSnapshot.digest([c.get("name"), sorted(([x.get("id"), x.get("name"), x.get("edgeState"), x.get("modelNumber")]
+                                                                            for x in c.get("edges") or [] if isinstance(x, dict)), key=str)])
+                        for c in customers}
+        changed = [c for c in customers if full or known.get(c["id"]) != fingerprints[c["id"]]]
+        removed = [] if self.ids else [i for i in known if i not in fingerprints]
+        print("topology: {} of {} enterprises changed, {} removed".format(len(changed), len(customers), len(removed)), file=sys.stderr)
+        if not changed and not removed:
+            topology.close()
+            return []
+
+        calls = []
+        for c in changed:
+            calls += [(config["edges_get_simple"]["url"], {"enterpriseId": c["id"]}), (config["enterprise_get_gateway"]["url"], {"enterpriseId": c["id"]})]
+        results = self.__fan_out(calls, **args)
+        errors = {}
+        edges = {}
+        gateways = {}
+        for i, c in enumerate(changed):
+            result, addresses = results[2 * i], results[2 * i + 1]
+            if isinstance(result, ApiException) or isinstance(addresses, ApiException):
+                errors[c["id"]] = str(result if isinstance(result, ApiException) else addresses)
+                continue
+            edges[c["id"]] = result
+            gateways[c["id"]] = {a.get("gatewayId", a.get("id")): a for a in addresses if a.get("type") == "gateway"}
+
+        # Gateways serving a changed enterprise now or before
+        refresh = sorted(set(g for gs in gateways.values() for g in gs) | topology.gateways_of(list(edges) + removed))
+        results = self.__fan_out([(config["gateway_get_edges"]["url"], {"gatewayId": g}) for g in refresh], **args)
+        edge_gateways = []
+        for g, result in zip(refresh, results):
+            if isinstance(result, ApiException):
+                for e, gs in gateways.items():
+                    if g in gs:
+                        errors[e] = "gatewayId {}: {}".format(g, result)
+                continue
+            edge_gateways += [(x.get("edgeId", x.get("id")), g, x.get("enterpriseId")) for x in result if x.get("enterpriseId") in edges]
+
+        enterprises = []
+        summary = []
+        for c in changed:
+            # A failed enterprise keeps its former topology and is refreshed again next time
+            if c["id"] in errors:
+                print("enterpriseId {}: {}".format(c["id"], errors[c["id"]]), file=sys.stderr)
+                summary.append({"name": c.get("name"), "enterpriseId": c["id"], "change": "error", "error": errors[c["id"]]})
+                continue
+            enterprises.append((c["id"], c.get("name"), fingerprints[c["id"]]))
+            summary.append({"name": c.get("name"), "enterpriseId": c["id"], "change": "refreshed" if c["id"] in known else "added",
+                            "edges": len(edges[c["id"]]), "gateways": len(gateways[c["id"]]), "error": None})
+        summary += [{"name": str(i), "enterpriseId": i, "change": "removed", "error": None} for i in removed]
+
+        done = {e[0] for e in enterprises}
+        topology.replace(enterprises,
+                         [(x["id"], e, x.get("name"), x.get("edgeState"), x.get("modelNumber")) for e in done for x in edges[e]],
+                         [(g, a.get("name"), a.get("address")) for e in done for g, a in gateways[e].items()],
+                         [(e, g) for e in done for g in gateways[e]],
+                         [x for x in edge_gateways if x[2] in done],
+                         removed)
+        topology.close()
+        return summary
+
+    def topology_query(self, hostname=None, db=None, gateway=None, edge=None, enterprise=None, summary=False, **args):
+        """
+        Answers out of the local topology (see topology_build): the edges behind the given gateways (impact),
+        the gateways of the given edges or the gateways of the given enterprises
+        """
+        if sum(x is not None for x in (gateway, edge, enterprise)) != 1:
+            raise VcoApiExecuteError("Exactly one of --gateway, --edge or --enterprise must be given")
+        topology = VcoTopology(db, hostname)
+        try:
+            if gateway is not None:
+                return topology.impact(gateway, summary)
+            if edge is not None:
+                return topology.edge_gateways(edge)
+            return topology.enterprise_gateways(enterprise)
+        finally:
+            topology.close()
+
+    def query_store(self, hostname=None, edgeid=None, starttime=None, endtime=None, store=None, **args):
+        """
+        Answers edges_get_lm and edges_get_agg_lm out of the local metrics store, without calling the VCO
+        """
+        edgeids = edgeid if isinstance(edgeid, list) or edgeid is None else [edgeid]
+        param = self.param[0] if isinstance(self.param, list) else self.param
+        if self.rollup:
+            windows = VcoMetricsStore(store, hostname).query([i for i in self.ids if i] or None, edgeids, starttime, endtime, bounds=True)
+            with self.timings.phase("rollup"):
+                return rollup_link_metrics(windows, param.get("metrics") or [], self.rollup, start=starttime, by=args.get("rollup_by") or "link",
+                                           percentiles=args.get("percentiles"), enterpriseid=self.ids[0] if len(self.ids) == 1 else None)
+        windows = VcoMetricsStore(store, hostname).query([i for i in self.ids if i] or None, edgeids, starttime, endtime)
+        return merge_link_metrics(windows, param.get("metrics") or [])
+
+    def __get_edges(self, edgeids=None):
+        """
+        Returns (enterpriseId, edgeId, name) of the given edges, or of all edges of the enterprises
+        """
+        if edgeids:
+            if len(self.ids) != 1:
+                raise VcoApiExecuteError("Edgeids can only be given together with exactly one enterpriseid")
+            return [(self.ids[0], d, str(d)) for d in edgeids]
+        calls = [(config["edges_get_simple"]["url"], {"enterpriseId": e}) for e in self.ids]
+        edges = []
+        for e, result in zip(self.ids, self.__fan_out(calls)):
+            if isinstance(result, ApiException):
+                print("enterpriseId {}: {}".format(e, result), file=sys.stderr)
+                continue
+            edges += [(e, x["id"], x.get("name", str(x["id"]))) for x in result]
+        return edges
+
+    def __checkpointed(self, calls, checkpoint=None, batch_size=None, workers=None, **args):
+        """
+        Runs the calls via __fan_out, skipping the ones recorded in the checkpoint journal and recording every
+        completed one right away. If the session expired, it logs in again once and continues.
+        Returns the results in the same order as the calls, as if all had been fetched in one go.
+        """
+        journal = VcoCheckpoint(checkpoint, self.client._hostname)
+        results = [None] * len(calls)
+        todo = []
+        for pos, (method, params) in enumerate(calls):
+            found, results[pos] = journal.get(method, params)
+            if not found:
+                todo.append(pos)
+        if len(todo) < len(calls):
+            print("checkpoint: {} of {} units done before, fetching {}".format(len(calls) - len(todo), len(calls), len(todo)), file=sys.stderr)
+
+        workers = max(int(workers or 1), 1)
+        size = max(min(int(batch_size or len(calls)), -(-len(calls) // workers)), 1)
+        reauthenticated = False
+        try:
+            # Slices keep every worker busy while completed units reach the journal early
+            while todo:
+                part, todo = todo[:size * workers], todo[size * workers:]
+                fetched = self.__fan_out([calls[pos] for pos in part], batch_size=size, workers=workers, **args)
+                expired = []
+                for pos, result in zip(part, fetched):
+                    results[pos] = result
+                    if not isinstance(result, ApiException):
+                        journal.add(calls[pos][0], calls[pos][1], result)
+                    elif is_auth_error(result):
+                        expired.append(pos)
+                if expired:
+                    if reauthenticated or not self.client.reauthenticate():
+                        for pos in todo:
+                            results[pos] = results[expired[0]]
+                        break
+                    reauthenticated = True
+                    todo = expired + todo
+        finally:
+            journal.close()
+        return results
+
+    def __fan_out(self, calls=None, batch_size=None, workers=None, use_async=None, **args):
+        """
+        Splits the calls (of several enterprises or time windows) into batches and runs them on a bounded worker pool sharing one session.
+        Returns the results in the same order as the calls.
+        """
+        if calls is None:
+            calls = [(self.url, p) for p in self.param]
+        if not calls:
+            return []
+        workers = max(int(workers or 1), 1)
+        # Batches are kept small enough to keep every worker busy
+        size = max(min(int(batch_size or len(calls)), -(-len(calls) // workers)), 1)
+        chunks = [calls[i:i + size] for i in range(0, len(calls), size)]
+
+        if use_async:
+            import asyncio
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return asyncio.run(self.__fan_out_async(calls, size, workers))
+            # Called within a running event loop (e.g. of an application embedding vcoclient), hence on a loop of its own
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+                return pool.submit(asyncio.run, self.__fan_out_async(calls, size, workers)).result()
+
+        def run(chunk):
+            try:
+                return self.client.call_batch(chunk, batch_size=size)
+            except ApiException as e:
+                return [e] * len(chunk)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            return [r for result in pool.map(run, chunks) for r in result]
+
+    async def __fan_out_async(self, calls, batch_size, workers):
+        """
+        Runs the batches on one event loop with at most workers requests in flight, instead of a thread per worker
+        """
+        async with AsyncVcoRequestManager(self.client._hostname, verify_ssl=self.client._verify_ssl, token=self.client._token,
+                                          concurrency=workers, cache=self.cache, timings=self.timings, retries=self.client._retries) as client:
+            client._store_cookie = self.client._store_cookie
+            return await client.call_batch(calls, batch_size=batch_size)
+
+    def __get_ids(self, ids):
+        """
+        Returns the given enterpriseid(s) as list. "all" is resolved to every enterprise the user can see.
+        """
+        if ids is None:
+            return []
+        if ids == "all":
+            return [c["id"] for c in self.__get_customers()]
+        if isinstance(ids, list):
+            return ids
+        return [ids]
+
+    def __get_customers(self):
+        """
+        Returns every enterprise the user can see incl. its edges, as operator or else as msp user
+        """
+        try:
+            return self.client.call_api(config["operator_customers_get"]["url"], self.__replace_placeholder(config["operator_customers_get"]["param"]))
+        except ApiException:
+            return self.client.call_api(config["msp_customers_get"]["url"], self.__replace_placeholder(config["msp_customers_get"]["param"]))
+
     @staticmethod
-    def __search_value(y, z):
-        """
-        Recrusively searches through dict to find given values seperated by |
-        """
-        def rsearch(x, s, p=''):
-            if isinstance(x, dict):
-                for _ in x:
-                    yield from rsearch(x[_], s, p + _ + "_")
-            elif isinstance(x, list):
-                i = 0
-                for _ in x:
-                    yield from rsearch(_, s, p + str(i) + "_")
-                    i += 1
-            elif s != "*":
-                for _ in s.split("|"):
-                    if _.upper() in str(x).upper():
-                        yield p[:-1], x
-            else:
-                yield p[:-1], x
-        return rsearch(y, z)
+    def __get_windows(param, window):
+        """
+        Splits the interval of the given param into consecutive windows of the given duration in ms.
+        Returns [None] if the interval is not split.
+        """
+        if not window or "interval" not in param:
+            return [None]
+        start, end = param["interval"]["start"], param["interval"]["end"]
+        if end <= start:
+            raise VcoApiExecuteError("End time must be after start time")
+        return [{"start": t, "end": min(t + window, end)} for t in range(start, end, window)]
+
+    def __merge_windows(self, results, rollup_by="link", percentiles=None, **args):
+        """
+        Merges the link metrics of all windows of each enterprise into one result, in the right time order.
+        With --rollup, the windows are the buckets rolled up by rollup_link_metrics instead.
+        """
+        if len(self.windows) == 1 and not self.rollup:
+            return results
+        metrics = (self.param[0].get("metrics") or [])
+        merged = []
+        for i in range(0, len(results), len(self.windows)):
+            group = results[i:i + len(self.windows)]
+            errors = [r for r in group if isinstance(r, ApiException)]
+            if errors:
+                merged.append(errors[0])
+                continue
+            if self.rollup:
+                with self.timings.phase("rollup"):
+                    merged.append(rollup_link_metrics([(w["start"], w["end"], r) for w, r in zip(self.windows, group)], metrics, self.rollup,
+                                                      by=rollup_by, percentiles=percentiles, enterpriseid=self.param[i].get("enterpriseId")))
+                continue
+            merged.append(merge_link_metrics([(w["end"] - w["start"], r) for w, r in zip(self.windows, group)], metrics))
+        return merged
+
+    def __merge_results(self, ids, results):
+        """
+        Merges the results of several enterprises into one list and tags each entry with its enterpriseId.
+        Errors of single enterprises are reported but do not fail the whole call, they are kept in self.failed.
+        """
+        merged = []
+        errors = []
+        for i, result in zip(ids, results):
+            if isinstance(result, ApiException):
+                errors.append(result)
+                if i is not None:
+                    self.failed.append({"enterpriseId": i})
+                    print("enterpriseId {}: {}".format(i, result), file=sys.stderr)
+                continue
+            if not isinstance(result, list):
+                result = [result]
+            for entry in result:
+                # Copies, as the results may still be held by the in-memory cache
+                if isinstance(entry, dict) and i is not None and "enterpriseId" not in entry:
+                    entry = dict(entry, enterpriseId=i)
+                merged.append(entry)
+        if errors and len(errors) == len(results):
+            raise errors[0]
+        return merged
+
+def project_params(param, filters, percentiles=None):
+    """
+    Returns the params reduced to the "with" expansions and metrics whose columns the given --filters can select.
+    With percentiles (a rollup), a metric is also kept if the filters match its rolled up columns (see rollup_link_metrics).
+    An expansion (e.g. site) is only left out if the filters can match neither its name nor any <name>_... column.
+    """
+    try:
+        pattern = re.compile(filters)
+    except re.error as e:
+        raise VcoApiExecuteError("Invalid --filters {!r}: {}".format(filters, e))
+    # A filter matching anything (e.g. ".*") selects every column, known or not
+    if pattern.search(""):
+        return param
+
+    def selects(column):
+        return pattern.search(column) is not None
+
+    def selects_any(name):
+        # Only a filter anchored at the start without alternatives is known to not match any <name>_... column
+        if not filters.startswith("^") or "|" in filters:
+            return True
+        prefix = re.match(r"[^.^$*+?{}\[\]\\|()]*", filters[1:]).group()
+        if len(prefix) < len(filters) - 1 and filters[1 + len(prefix)] in "*?{":
+            # The last literal is optional
+            prefix = prefix[:-1]
+        return (name + "_").startswith(prefix) or prefix.startswith(name + "_")
+
+    param = dict(param)
+    if isinstance(param.get("with"), list):
+        param["with"] = [w for w in param["with"] if selects(w) or selects_any(w)]
+    if isinstance(param.get("metrics"), list):
+        # The VCO needs at least one metric, the link columns are returned anyway
+        def columns(m):
+            if percentiles is None or link_metric_rollup(m) != "percentiles":
+                return [m]
+            return ["{}_p{:g}".format(m, q) for q in (percentiles or [50, 95, 99])] + ["{}_max".format(m)]
+        param["metrics"] = [m for m in param["metrics"] if any(selects(c) for c in columns(m))] or param["metrics"][:1]
+    return param
+
+def link_metric_aggregation(metric):
+    """
+    Returns how values of the given link metric of several time windows are merged into one.
+    Byte and packet counters are summed, everything else (e.g. bestLatencyMsRx or scoreTx) is averaged weighted by time.
+    """
+    return "sum" if re.search("bytes|packets", metric, re.IGNORECASE) else "mean"
+
+def link_metric_rollup(metric):
+    """
+    Returns how values of the given link metric are rolled up over buckets by rollup_link_metrics.
+    Byte and packet counters are summed, latency, jitter and loss get percentiles and everything else is averaged.
+    """
+    if re.match(r"best(Latency|Jitter)Ms|bestLossPct", metric):
+        return "percentiles"
+    return link_metric_aggregation(metric)
+
+def merge_link_metrics(windows, metrics):
+    """
+    Merges link metrics results of consecutive time windows, given as list of (duration in ms, result), into one result.
+    Other values than metrics (e.g. link state) are taken from the latest window.
+    """
+    merged = {}
+    weights = {}
+    for duration, result in windows:
+        for r in result:
+            link = r.get("link") if isinstance(r.get("link"), dict) else {}
+            key = r.get("linkId", link.get("internalId", r.get("name")))
+            if key not in merged:
+                merged[key] = {}
+                weights[key] = {}
+            m, w = merged[key], weights[key]
+            for k, v in r.items():
+                if k not in metrics:
+                    m[k] = v
+                elif not isinstance(v, (int, float)):
+                    m.setdefault(k, v)
+                elif link_metric_aggregation(k) == "sum":
+                    m[k] = (m.get(k) or 0) + v
+                else:
+                    m[k] = ((m.get(k) or 0) * w.get(k, 0) + v * duration) / (w.get(k, 0) + duration)
+                    w[k] = w.get(k, 0) + duration
+    return list(merged.values())
+
+def rollup_link_metrics(windows, metrics, bucket, start=None, by="link", percentiles=None, enterpriseid=None):
+    """
+    Rolls up link metrics of time windows, given as list of (start, end, result), into fixed buckets of the given
+    duration in ms, and those per link, edge or enterprise (by). Counters (bytes, packets) are summed, latency,
+    jitter and loss get the given percentiles (default 50, 95, 99) and the max over all buckets (and links) of
+    a group, everything else is averaged weighted by time. Computed on one array per metric of links x buckets.
+    """
+    pd, np = load_pandas()
+    percentiles = list(percentiles or [50, 95, 99])
+    if not windows:
+        return []
+    start = min(w[0] for w in windows) if start is None else start
+
+    # Long format: one row per link and window
+    links = {}
+    info = []
+    rows, cols, durations, values = [], [], [], {m: [] for m in metrics}
+    for s, e, result in windows:
+        b = int((s - start) // bucket)
+        for r in result or []:
+            link = r.get("link") if isinstance(r.get("link"), dict) else {}
+            key = r.get("linkId", link.get("internalId", r.get("name")))
+            edgeid = link.get("edgeId", r.get("edgeId"))
+            if (edgeid, key) not in links:
+                links[(edgeid, key)] = len(info)
+                info.append({"linkId": key, "edgeId": edgeid, "edgeName": link.get("edgeName"),
+                             "enterpriseId": r.get("enterpriseId", link.get("enterpriseId", enterpriseid)),
+                             "interface": link.get("interface", r.get("name"))})
+            rows.append(links[(edgeid, key)])
+            cols.append(b)
+            durations.append(e - s)
+            for m in metrics:
+                v = r.get(m)
+                values[m].append(v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan)
+    if not info:
+        return []
+    rows, cols, durations = np.array(rows), np.array(cols), np.array(durations, dtype=np.float64)
+    shape = (len(info), int(cols.max()) + 1)
+
+    # Groups of links, each link belongs to exactly one
+    if by == "link":
+        keys = list(range(len(info)))
+    elif by == "edge":
+        keys = [(x["enterpriseId"], x["edgeId"]) for x in info]
+    else:
+        keys = [x["enterpriseId"] for x in info]
+    groups = {}
+    group = np.array([groups.setdefault(k, len(groups)) for k in keys])
+    order = np.argsort(group, kind="stable")
+    bounds = np.searchsorted(group[order], np.arange(len(groups) + 1))
+
+    # Number of buckets having data per group
+    present = np.zeros(shape, dtype=bool)
+    present[rows, cols] = True
+    out = [{"buckets": int(present[order[bounds[g]:bounds[g + 1]]].any(axis=0).sum())} for g in range(len(groups))]
+
+    for m in metrics:
+        v = np.array(values[m], dtype=np.float64)
+        ok = ~np.isnan(v)
+        kind = link_metric_rollup(m)
+        if kind == "sum":
+            total = np.bincount(group[rows[ok]], weights=v[ok], minlength=len(groups))
+            seen = np.bincount(group[rows[ok]], minlength=len(groups)) > 0
+            for g in range(len(groups)):
+                if seen[g]:
+                    out[g][m] = int(total[g]) if float(total[g]).is_integer() else float(total[g])
+            continue
+        # Time weighted mean of the windows within each bucket, the value of that bucket
+        weighted = np.zeros(shape)
+        weights = np.zeros(shape)
+        np.add.at(weighted, (rows[ok], cols[ok]), v[ok] * durations[ok])
+        np.add.at(weights, (rows[ok], cols[ok]), durations[ok])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            matrix = np.where(weights > 0, weighted / weights, np.nan)
+        if kind == "mean":
+            total = np.bincount(group[rows[ok]], weights=v[ok] * durations[ok], minlength=len(groups))
+            weight = np.bincount(group[rows[ok]], weights=durations[ok], minlength=len(groups))
+            for g in range(len(groups)):
+                if weight[g] > 0:
+                    out[g][m] = float(total[g] / weight[g])
+            continue
+        if by == "link":
+            found = ~np.isnan(matrix).all(axis=1)
+            q = np.full((len(percentiles), len(info)), np.nan)
+            q[:, found] = np.nanpercentile(matrix[found], percentiles, axis=1)
+            peak = np.full(len(info), np.nan)
+            peak[found] = np.nanmax(matrix[found], axis=1)
+            for g in np.flatnonzero(found):
+                out[g].update(("{}_p{:g}".format(m, p), float(q[i, g])) for i, p in enumerate(percentiles))
+                out[g]["{}_max".format(m)] = float(peak[g])
+            continue
+        for g in range(len(groups)):
+            x = matrix[order[bounds[g]:bounds[g + 1]]].ravel()
+            x = x[~np.isnan(x)]
+            if len(x):
+                out[g].update(("{}_p{:g}".format(m, p), float(q)) for p, q in zip(percentiles, np.percentile(x, percentiles)))
+                out[g]["{}_max".format(m)] = float(x.max())
+
+    rolled = []
+    edges = len({x["edgeId"] for x in info})
+    for key, g in groups.items():
+        first = info[order[bounds[g]]]
+        if by == "link":
+            name = first["interface"] if edges == 1 else "{}:{}".format(first["edgeName"] or first["edgeId"], first["interface"])
+            head = {"name": str(name), "linkId": first["linkId"], "edgeId": first["edgeId"], "interface": first["interface"]}
+        elif by == "edge":
+            head = {"name": str(first["edgeName"] or first["edgeId"]), "edgeId": first["edgeId"], "links": int(bounds[g + 1] - bounds[g])}
+        else:
+            head = {"name": str(first["enterpriseId"]), "edges": len({info[i]["edgeId"] for i in order[bounds[g]:bounds[g + 1]]}), "links": int(bounds[g + 1] - bounds[g])}
+        if first["enterpriseId"] is not None:
+            head["enterpriseId"] = first["enterpriseId"]
+        head.update(out[g])
+        rolled.append(head)
+    return rolled
+
+def write_ndjson(record):
+    """
+    Writes one record as json line to stdout. Returns False once the reader is gone (e.g. head), so the writer stops quietly.
+    """
+    try:
+        sys.stdout.write(json.dumps(record, default=str) + "\n")
+        sys.stdout.flush()
+        return True
+    except BrokenPipeError:
+        # Otherwise flushing stdout at exit fails once more
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return False
+
+def iter_json_result(chunks):
+    """
+    Incrementally decodes a JSON-RPC response given as chunks of bytes.
+    Yields the entries of the result array one by one (or the result itself, if it is not an array).
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    state = {"buf": "", "pos": 0, "eof": False}
+
+    def more():
+        for chunk in chunks:
+            if chunk:
+                # Drop what was already consumed, so the buffer only holds the entry being decoded
+                state["buf"] = state["buf"][state["pos"]:] + utf8.decode(chunk)
+                state["pos"] = 0
+                return True
+        state["eof"] = True
+        return False
+
+    def peek():
+        while True:
+            buf = state["buf"]
+            while state["pos"] < len(buf) and buf[state["pos"]] in " \t\r\n":
+                state["pos"] += 1
+            if state["pos"] < len(buf):
+                return buf[state["pos"]]
+            if not more():
+                raise ApiException("Unexpected end of response")
+
+    def expect(c):
+        if peek() != c:
+            raise ApiException("Invalid response, expected '{}'".format(c))
+        state["pos"] += 1
+
+    def value():
+        peek()
+        size = 0
+        while True:
+            try:
+                v, end = decoder.raw_decode(state["buf"], state["pos"])
+                # A number at the end of the buffer might be cut off, hence only trust it once more data followed
+                if end < len(state["buf"]) or state["eof"]:
+                    state["pos"] = end
+                    return v
+            except ValueError:
+                if state["eof"]:
+                    raise ApiException("Invalid JSON in response")
+            # Read at least twice as much before decoding again, to not re-decode large entries too often
+            size = max(size * 2, len(state["buf"]) - state["pos"] + 1)
+            while len(state["buf"]) - state["pos"] < size and more():
+                pass
+
+    expect("{")
+    while True:
+        c = peek()
+        if c == "}":
+            return
+        if c == ",":
+            state["pos"] += 1
+            continue
+        key = value()
+        expect(":")
+        if key == "result" and peek() == "[":
+            state["pos"] += 1
+            while True:
+                c = peek()
+                if c == "]":
+                    state["pos"] += 1
+                    break
+                if c == ",":
+                    state["pos"] += 1
+                    continue
+                yield value()
+        elif key == "result":
+            yield value()
+        elif key == "error":
+            error = value()
+            raise ApiException(error.get("message", str(error)) if isinstance(error, dict) else str(error))
+        else:
+            value()
+
+def flatten_record(d, prefix="", sep="_"):
+    """
+    Flattens nested dicts the same way as pandas json_normalize does, e.g. {"site":{"name":x}} to {"site_name":x}
+    """
+    out = {}
+    nested = []
+    for k, v in d.items():
+        if isinstance(v, dict):
+            nested.append((k, v))
+        else:
+            out[prefix + str(k)] = v
+    for k, v in nested:
+        out.update(flatten_record(v, prefix + str(k) + sep, sep))
+    return out
+
+def compact_series(pd, np, values, index=None, floats=True, categories=True):
+    """
+    Returns the values of one column as series of the most compact dtype showing the same values: categoricals for
+    repeated strings, the smallest integer type, float32 if no value changes and the nullable boolean for bools with gaps
+    """
+    s = pd.Series(values, index=index)
+    if s.dtype.kind == "i":
+        return pd.to_numeric(s, downcast="integer")
+    if s.dtype.kind == "f":
+        if floats and len(s):
+            f = s.astype(np.float32)
+            if (f.astype(np.float64).eq(s) | s.isna()).all():
+                return f
+        return s
+    if s.dtype.kind not in "OT" and not isinstance(s.dtype, pd.StringDtype):
+        return s
+    present = s.dropna()
+    if len(present) == 0:
+        return s
+    kinds = set(map(type, present))
+    if kinds == {bool}:
+        return s.astype("boolean")
+    if kinds == {str} and categories and present.nunique() * 2 <= len(present):
+        return s.astype("category")
+    return s
+
+def vco_list(hostname):
+    """
+    Returns the VCOs of the given --vco value, either one hostname, a comma separated list of hostnames or @file,
+    an inventory file with one hostname per line (empty lines and # comments are ignored)
+    """
+    if not hostname:
+        return [hostname]
+    if hostname.startswith("@"):
+        try:
+            with open(os.path.expanduser(hostname[1:])) as f:
+                hostnames = [line.split("#", 1)[0].strip() for line in f]
+        except OSError as e:
+            raise VcoApiExecuteError("Cannot read VCO inventory {}: {}".format(hostname[1:], e))
+    else:
+        hostnames = [h.strip() for h in hostname.split(",")]
+    vcos = list(dict.fromkeys(h for h in hostnames if h))
+    if not vcos:
+        raise VcoApiExecuteError("No VCO given by {}".format(hostname))
+    return vcos
+
+def valid_id_list_type(arg_id_str):
+    """custom argparse type for one or several comma separated ids, or 'all', given from the command line"""
+    if str(arg_id_str).strip().lower() == "all":
+        return "all"
+    try:
+        ids = [int(i) for i in str(arg_id_str).split(",") if i.strip()]
+    except ValueError:
+        ids = []
+    if not ids:
+        msg = "Given ID ({0}) not valid! Expected format, 'ID', 'ID,ID,...' or 'all'!".format(arg_id_str)
+        raise argparse.ArgumentTypeError(msg)
+    return ids
+
+def valid_percentiles_type(arg_percentiles_str):
+    """custom argparse type for comma separated percentiles like 50,95,99.9 given from the command line"""
+    try:
+        percentiles = [float(p) for p in str(arg_percentiles_str).split(",") if p.strip()]
+    except ValueError:
+        percentiles = []
+    if not percentiles or not all(0 <= p <= 100 for p in percentiles):
+        msg = "Given percentiles ({0}) not valid! Expected format, e.g. '50,95,99'!".format(arg_percentiles_str)
+        raise argparse.ArgumentTypeError(msg)
+    return percentiles
+
+def valid_size_type(arg_size_str):
+    """custom argparse type for user sizes like 512M or 2G given from the command line, returned in bytes"""
+    units = {"": 1, "k": 2**10, "m": 2**20, "g": 2**30}
+    m = re.fullmatch(r"\s*(\d+)\s*([kmg]?)b?\s*", str(arg_size_str), re.IGNORECASE)
+    if not m or int(m.group(1)) == 0:
+        msg = "Given size ({0}) not valid! Expected format, e.g. '512M' or '2G'!".format(arg_size_str)
+        raise argparse.ArgumentTypeError(msg)
+    return int(m.group(1)) * units[m.group(2).lower()]
+
+def valid_duration_type(arg_duration_str):
+    """custom argparse type for user durations like 30m, 6h or 1d given from the command line, returned in ms"""
+    units = {"s": 1000, "m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000, "w": 7 * 24 * 60 * 60 * 1000}
+    m = re.fullmatch(r"\s*(\d+)\s*([smhdw])\s*", str(arg_duration_str))
+    if not m or int(m.group(1)) == 0:
+        msg = "Given duration ({0}) not valid! Expected format, e.g. '30m', '6h', '1d' or '1w'!".format(arg_duration_str)
+        raise argparse.ArgumentTypeError(msg)
+    return int(m.group(1)) * units[m.group(2)]
 
 def valid_datetime_type(arg_datetime_str):
     """custom argparse type for user datetime values given from the command line"""
@@ -343,6 +2906,9 @@ def valid_datetime_type(arg_datetime_str):
             raise argparse.ArgumentTypeError(msg)  
 
 
+# Link metrics collected by edges_get_lm, edges_get_agg_lm and metrics_sync
+link_metrics = ["bytesRx", "bytesTx", "totalBytes", "totalPackets", "p1BytesRx", "p1BytesTx", "p1PacketsRx", "p1PacketsTx", "p2BytesRx", "p2BytesTx", "p2PacketsRx", "p2PacketsTx", "p3BytesRx", "p3BytesTx", "p3PacketsRx", "p3PacketsTx", "packetsRx", "packetsTx", "controlBytesRx", "controlBytesTx", "controlPacketsRx", "controlPacketsTx", "bestBwKbpsRx", "bestBwKbpsTx", "bestJitterMsRx", "bestJitterMsTx", "bestLatencyMsRx", "bestLatencyMsTx", "bestLossPctRx", "bestLossPctTx", "bpsOfBestPathRx", "bpsOfBestPathTx", "signalStrength", "scoreTx", "scoreRx"]
+
 config = {
     "default"               : {
 
@@ -390,7 +2956,7 @@ config = {
                                     "param"      : '{ "with":["site","ha","recentLinks"], "enterpriseId":%(enterpriseid)i }', 
                                     "description": "Get basic information for all/some VCEs",
                                     "argparse"   : { 
-                                        "enterpriseid": {"action":"store", "type":int, "default":1, "help":"Returns the Edges of only that given enterprise. Default all Edges of all enterprises at operator view or all Edges of an enterprise at customer view are returned." }
+                                        "enterpriseid": {"action":"store", "type":valid_id_list_type, "default":1, "help":"Returns the Edges of only that given enterprise. Several enterprises can be given comma separated, e.g. 1,5,9, or 'all' for every enterprise. Those are fetched concurrently in batched requests. Default all Edges of all enterprises at operator view or all Edges of an enterprise at customer view are returned." }
                                     }
                              },
    
@@ -399,28 +2965,87 @@ config = {
                                     "param"      : '{ "with":["site","ha","configuration","recentLinks","cloudServices","nvsFromEdge","vnfs","certificateSummary","secureDeviceSecrets"], "enterpriseId":%(enterpriseid)i }', 
                                     "description": "Get all informations for all/some VCEs",
                                     "argparse"   : { 
-                                        "enterpriseid": {"action":"store", "type":int, "default":1, "help":"Returns the Edges of only that given enterprise. Default all Edges of all enterprises at operator view or all Edges of an enterprise at customer view are returned." }
+                                        "enterpriseid": {"action":"store", "type":valid_id_list_type, "default":1, "help":"Returns the Edges of only that given enterprise. Several enterprises can be given comma separated, e.g. 1,5,9, or 'all' for every enterprise. Those are fetched concurrently in batched requests. Default all Edges of all enterprises at operator view or all Edges of an enterprise at customer view are returned." }
                                     }
                              },
     "edges_get_lm"           : {
                                     "url"        : "metrics/getEdgeLinkMetrics",
-                                    "param"      : '{ "edgeId": %(edgeid)i, "enterpriseId": %(enterpriseid)i, "interval": { "end": %(endtime)i, "start": %(starttime)i}, "metrics": ["bytesRx", "bytesTx", "totalBytes", "totalPackets", "p1BytesRx", "p1BytesTx", "p1PacketsRx", "p1PacketsTx", "p2BytesRx", "p2BytesTx", "p2PacketsRx", "p2PacketsTx", "p3BytesRx", "p3BytesTx", "p3PacketsRx", "p3PacketsTx", "packetsRx", "packetsTx", "controlBytesRx", "controlBytesTx", "controlPacketsRx", "controlPacketsTx", "bestBwKbpsRx", "bestBwKbpsTx", "bestJitterMsRx", "bestJitterMsTx", "bestLatencyMsRx", "bestLatencyMsTx", "bestLossPctRx", "bestLossPctTx", "bpsOfBestPathRx", "bpsOfBestPathTx", "signalStrength", "scoreTx", "scoreRx"]}',
+                                    "param"      : '{ "edgeId": %(edgeid)i, "enterpriseId": %(enterpriseid)i, "interval": { "end": %(endtime)i, "start": %(starttime)i}, "metrics": ' + json.dumps(link_metrics) + '}',
                                     "description": "Collect link statistics for a VCE between a given period",
                                     "argparse"   : { 
-                                        "enterpriseid": {"action":"store", "type":int, "default":0, "help":"Get information for that specific Edge in that specific customer. EnterpriseId can be either found from *_customers_get method under id or edges_get method under enterpriseId." },
+                                        "enterpriseid": {"action":"store", "type":valid_id_list_type, "default":0, "help":"Get information for that specific Edge in that specific customer. EnterpriseId can be either found from *_customers_get method under id or edges_get method under enterpriseId." },
                                         "edgeid"      : {"action":"store", "type":int, "required":True, "help":"Get information for that specific Edge. Edgeid can be found under edges_get method under id."},
                                         "starttime"   : {"action":"store", "type":valid_datetime_type, "required":True,"help":"The start time from when one wants to get the data. Format is in YYYY-MM-DD or YYYY-MM-DD HH:MM."},
-                                        "endtime"     : {"action":"store", "type":valid_datetime_type, "default":valid_datetime_type(str(datetime.date.today())),"help":"The end time from when one wants to get the data. Format is in YYYY-MM-DD or YYYY-MM-DD HH:MM."}
+                                        "endtime"     : {"action":"store", "type":valid_datetime_type, "default":str(datetime.date.today()),"help":"The end time from when one wants to get the data. Format is in YYYY-MM-DD or YYYY-MM-DD HH:MM."},
+                                        "slice"       : {"action":"store", "type":valid_duration_type, "default":None, "help":"Splits the time between start and end into windows of given duration (e.g. 6h or 1d), which are fetched concurrently and merged. Counters are summed and all other metrics are averaged weighted by time."},
+                                        "rollup"      : {"action":"store", "type":valid_duration_type, "default":None, "help":"Fetches the time between start and end in buckets of given duration (e.g. 1h) and rolls them up: counters are summed, latency, jitter and loss get --percentiles and the max over the buckets, everything else is averaged."},
+                                        "rollup-by"   : {"action":"store", "type":str, "dest":"rollup_by", "default":"link", "choices":["link", "edge", "enterprise"], "help":"Rolls up per link (default), per edge or per enterprise."},
+                                        "percentiles" : {"action":"store", "type":valid_percentiles_type, "default":[50, 95, 99], "help":"Comma separated percentiles of latency, jitter and loss of --rollup. Default 50,95,99."},
+                                        "from-store"  : {"action":"store_true", "dest":"from_store", "default":False, "help":"Answers out of the local metrics store (see metrics_sync) instead of calling the VCO. Only windows fully between start and end time are taken into account."},
+                                        "store"       : {"action":"store", "type":str, "default":os.getenv('VCO_METRICS_STORE', os.getenv('VCO_COOKIE_PATH', "/tmp/") + "vcoclient_metrics/"), "help":"Path of the local metrics store, filled by metrics_sync."}
                                     }
                              },
     "edges_get_agg_lm"           : {
                                     "url"        : "monitoring/getAggregateEdgeLinkMetrics",
-                                    "param"      : '{ "enterpriseId": %(enterpriseid)i, "interval": { "end": %(endtime)i, "start": %(starttime)i}, "metrics": ["bytesRx", "bytesTx", "totalBytes", "totalPackets", "p1BytesRx", "p1BytesTx", "p1PacketsRx", "p1PacketsTx", "p2BytesRx", "p2BytesTx", "p2PacketsRx", "p2PacketsTx", "p3BytesRx", "p3BytesTx", "p3PacketsRx", "p3PacketsTx", "packetsRx", "packetsTx", "controlBytesRx", "controlBytesTx", "controlPacketsRx", "controlPacketsTx", "bestBwKbpsRx", "bestBwKbpsTx", "bestJitterMsRx", "bestJitterMsTx", "bestLatencyMsRx", "bestLatencyMsTx", "bestLossPctRx", "bestLossPctTx", "bpsOfBestPathRx", "bpsOfBestPathTx", "signalStrength", "scoreTx", "scoreRx"]}',
+                                    "param"      : '{ "enterpriseId": %(enterpriseid)i, "interval": { "end": %(endtime)i, "start": %(starttime)i}, "metrics": ' + json.dumps(link_metrics) + '}',
                                     "description": "Collect aggregated link statistics for several VCEs between a given period",
                                     "argparse"   : { 
-                                        "enterpriseid": {"action":"store", "type":int, "required": True, "default":0, "help":"Get information for that specific Edge in that specific customer. EnterpriseId can be either found from *_customers_get method under id or edges_get method under enterpriseId." },
+                                        "enterpriseid": {"action":"store", "type":valid_id_list_type, "required": True, "default":0, "help":"Get information for that specific Edge in that specific customer. EnterpriseId can be either found from *_customers_get method under id or edges_get method under enterpriseId. Several enterprises can be given comma separated, e.g. 1,5,9, or 'all' for every enterprise." },
                                         "starttime"   : {"action":"store", "type":valid_datetime_type, "required":True,"help":"The start time from when one wants to get the data. Format is in YYYY-MM-DD or YYYY-MM-DD HH:MM."},
-                                        "endtime"     : {"action":"store", "type":valid_datetime_type, "default":valid_datetime_type(str(datetime.date.today())),"help":"The end time from when one wants to get the data. Format is in YYYY-MM-DD or YYYY-MM-DD HH:MM."}
+                                        "endtime"     : {"action":"store", "type":valid_datetime_type, "default":str(datetime.date.today()),"help":"The end time from when one wants to get the data. Format is in YYYY-MM-DD or YYYY-MM-DD HH:MM."},
+                                        "slice"       : {"action":"store", "type":valid_duration_type, "default":None, "help":"Splits the time between start and end into windows of given duration (e.g. 6h or 1d), which are fetched concurrently and merged. Counters are summed and all other metrics are averaged weighted by time."},
+                                        "rollup"      : {"action":"store", "type":valid_duration_type, "default":None, "help":"Fetches the time between start and end in buckets of given duration (e.g. 1h) and rolls them up: counters are summed, latency, jitter and loss get --percentiles and the max over the buckets, everything else is averaged."},
+                                        "rollup-by"   : {"action":"store", "type":str, "dest":"rollup_by", "default":"link", "choices":["link", "edge", "enterprise"], "help":"Rolls up per link (default), per edge or per enterprise."},
+                                        "percentiles" : {"action":"store", "type":valid_percentiles_type, "default":[50, 95, 99], "help":"Comma separated percentiles of latency, jitter and loss of --rollup. Default 50,95,99."},
+                                        "from-store"  : {"action":"store_true", "dest":"from_store", "default":False, "help":"Answers out of the local metrics store (see metrics_sync) instead of calling the VCO. Only windows fully between start and end time are taken into account."},
+                                        "store"       : {"action":"store", "type":str, "default":os.getenv('VCO_METRICS_STORE', os.getenv('VCO_COOKIE_PATH', "/tmp/") + "vcoclient_metrics/"), "help":"Path of the local metrics store, filled by metrics_sync."}
+                                    }
+                             },
+    "metrics_sync"           : {
+                                    "url"        : "metrics/getEdgeLinkMetrics",
+                                    "param"      : '{ "metrics": ' + json.dumps(link_metrics) + '}',
+                                    "call"       : "metrics_sync",
+                                    "description": "Fetches the link statistics of VCEs since their last sync and appends them to the local metrics store, e.g. to be used by edges_get_lm --from-store",
+                                    "argparse"   : {
+                                        "enterpriseid": {"action":"store", "type":valid_id_list_type, "required":True, "help":"Syncs the Edges of the given enterprise. Several enterprises can be given comma separated, e.g. 1,5,9, or 'all' for every enterprise." },
+                                        "edgeid"      : {"action":"store", "type":valid_id_list_type, "default":None, "help":"Syncs only the given Edges (comma separated) of the enterprise. Default all Edges are synced."},
+                                        "starttime"   : {"action":"store", "type":valid_datetime_type, "default":None, "help":"Start time for Edges which were never synced before. Format is in YYYY-MM-DD or YYYY-MM-DD HH:MM. Default one day ago."},
+                                        "slice"       : {"action":"store", "type":valid_duration_type, "default":"1h", "help":"Duration of each stored window (e.g. 5m or 1h). Only complete windows are synced. Default 1h."},
+                                        "store"       : {"action":"store", "type":str, "default":os.getenv('VCO_METRICS_STORE', os.getenv('VCO_COOKIE_PATH', "/tmp/") + "vcoclient_metrics/"), "help":"Path of the local metrics store, filled by metrics_sync."}
+                                    }
+                             },
+    "topology_build"         : {
+                                    "call"       : "topology_build",
+                                    "description": "Gathers which gateways serve which enterprises and edges into a local, indexed topology for topology_query. Only enterprises which changed since the last build are fetched again.",
+                                    "argparse"   : {
+                                        "enterpriseid": {"action":"store", "type":valid_id_list_type, "default":None, "help":"Builds the topology of the given enterprises only (comma separated). Default every enterprise the user can see." },
+                                        "full"        : {"action":"store_true", "default":False, "help":"Fetches every enterprise again, not only the changed ones."},
+                                        "db"          : {"action":"store", "type":str, "default":os.getenv('VCO_TOPOLOGY', os.getenv('VCO_COOKIE_PATH', "/tmp/") + "vcoclient_topology/"), "help":"Path of the local topology."}
+                                    }
+                             },
+    "topology_query"         : {
+                                    "call"       : "topology_query",
+                                    "description": "Answers out of the local topology (see topology_build), without calling the VCO: the edges and customers affected by a gateway, or the gateways of an edge or an enterprise.",
+                                    "argparse"   : {
+                                        "gateway"     : {"action":"store", "type":str, "default":None, "help":"Returns the edges assigned to the given gateways (ids or names, comma separated), incl. the number of gateways each edge has."},
+                                        "summary"     : {"action":"store_true", "default":False, "help":"Together with --gateway, returns the affected edges per enterprise instead, incl. those isolated (no other gateway)."},
+                                        "edge"        : {"action":"store", "type":str, "default":None, "help":"Returns the gateways of the given edges (ids or names, comma separated)."},
+                                        "enterprise"  : {"action":"store", "type":str, "default":None, "help":"Returns the gateways of the given enterprises (ids or names, comma separated) and the number of their edges on each."},
+                                        "db"          : {"action":"store", "type":str, "default":os.getenv('VCO_TOPOLOGY', os.getenv('VCO_COOKIE_PATH', "/tmp/") + "vcoclient_topology/"), "help":"Path of the local topology."}
+                                    }
+                             },
+    "live_watch"             : {
+                                    "call"       : "live_watch",
+                                    "mani"       : "",
+                                    "description": "Enters live mode for VCEs and writes every changed live datapoint (e.g. link stats) as one json object per line, until the duration is over or interrupted. Live mode is always exited again.",
+                                    "argparse"   : {
+                                        "enterpriseid": {"action":"store", "type":valid_id_list_type, "required":True, "help":"Watches the Edges of the given enterprise." },
+                                        "edgeid"      : {"action":"store", "type":valid_id_list_type, "default":None, "help":"Watches only the given Edges (comma separated) of the enterprise. Default all Edges are watched."},
+                                        "interval"    : {"action":"store", "type":float, "default":5, "help":"Seconds between two reads of the live data. Default 5."},
+                                        "duration"    : {"action":"store", "type":valid_duration_type, "default":None, "help":"Stops watching after the given duration (e.g. 90s or 10m). Default until interrupted."},
+                                        "buffer"      : {"action":"store", "type":int, "default":1000, "help":"Maximum number of datapoints buffered before polling pauses for the output to catch up. Default 1000."},
+                                        "rows_name"   : None,
+                                        "stats"       : None
                                     }
                              },
     "operator_customers_get" : {
@@ -448,7 +3073,7 @@ config = {
                                     "param"      : '{ "enterpriseId": %(enterpriseid)i }',
                                     "description": "Get gateways associated to given etnerprise",
                                     "argparse"   : { 
-                                        "enterpriseid": {"action":"store", "type":int, "required":True, "help":"Provide enterpriseid to get the gateways" }
+                                        "enterpriseid": {"action":"store", "type":valid_id_list_type, "required":True, "help":"Provide enterpriseid to get the gateways. Several enterprises can be given comma separated, e.g. 1,5,9, or 'all' for every enterprise." }
                                     }
                              },
     #"enterprise_get_edge_status": {
@@ -461,7 +3086,7 @@ config = {
      #                               "description": "Get status of all enterprise edges",
      #                               "argparse"   : { 
      #                                   "enterpriseid": {"action":"store", "type":int, "default":0, "help":"EnterpriseId can be either found from *_customers_get method under id or edges_get method under enterpriseId." },
-     #                                   "time"      : {"action":"store", "type":valid_datetime_type, "default":valid_datetime_type(str(datetime.date.today())),"help":"The end time from when one wants to get the data. Format is in YYYY-MM-DD or YYYY-MM-DD HH:MM."},
+     #                                   "time"      : {"action":"store", "type":valid_datetime_type, "default":str(datetime.date.today()),"help":"The end time from when one wants to get the data. Format is in YYYY-MM-DD or YYYY-MM-DD HH:MM."},
      #                                   "filters"   : None,
      #                                   "rows_name" : None,
      #                                   "stats"     : None,
@@ -484,15 +3109,326 @@ config = {
     }
 }
 
-if __name__ == "__main__":
+# Options naming local files, resolved against the working directory of the caller before a command is forwarded
+daemon_path_options = ("checkpoint", "diff_against", "store", "db")
+
+def daemon_request(args):
     """
-    Based on the arguements provided, it will execute a given function
+    Returns the request forwarding the parsed arguments of a command to the daemon: relative paths made absolute
+    and the session environment (VCO_TOKEN, VCO_COOKIE_PATH and VCO_VERIFY_SSL) of the caller
+    """
+    args = dict(args)
+    for key in daemon_path_options:
+        if isinstance(args.get(key), str):
+            args[key] = os.path.abspath(args[key])
+    if isinstance(args.get("hostname"), str) and args["hostname"].startswith("@"):
+        args["hostname"] = "@" + os.path.abspath(args["hostname"][1:])
+    env = {"token": os.getenv('VCO_TOKEN', ""), "path": os.getenv('VCO_COOKIE_PATH', "/tmp/"), "verify_ssl": os.getenv('VCO_VERIFY_SSL', False)}
+    return {"args": args, "env": env}
+
+def daemon_socket():
+    """
+    Path of the Unix socket the daemon listens on
+    """
+    return os.getenv('VCO_DAEMON_SOCKET', os.getenv('VCO_COOKIE_PATH', "/tmp/") + "vcoclient.sock")
+
+class VcoDaemonStderr(object):
+    """
+    Stands in for sys.stderr within the daemon: what a command writes (e.g. errors of single enterprises)
+    is collected for its caller, everything else goes to the stderr of the daemon
+    """
+    buffer = contextvars.ContextVar("buffer", default=None)
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, s):
+        return (self.buffer.get() or self.stream).write(s)
+
+    def flush(self):
+        if self.buffer.get() is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+class VcoDaemonHandler(socketserver.StreamRequestHandler):
+    """
+    Executes one forwarded command per connection: a json line {"args": {...}, "env": {...}} is answered by a json line
+    {"stdout": ..., "stderr": ...} or {"error": ..., "type": ..., "stderr": ...}
+    """
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get("ping"):
+                response = {"stdout": None}
+            elif request.get("stop"):
+                response = {"stdout": None}
+                threading.Thread(target=self.server.shutdown).start()
+            else:
+                VcoDaemonStderr.buffer.set(io.StringIO())
+                response = {"stdout": self.server.execute(request["args"], request.get("env"))}
+        except Exception as e:
+            response = {"error": str(e), "type": type(e).__name__}
+        if VcoDaemonStderr.buffer.get() is not None:
+            response["stderr"] = VcoDaemonStderr.buffer.get().getvalue()
+        self.wfile.write(json.dumps(response, default=str).encode() + b"\n")
+
+class VcoDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Background process keeping authenticated sessions, their connection pools, decoded responses and pandas in memory.
+    Commands are forwarded by forward_to_daemon over a Unix socket only accessible by the same user.
+    """
+    daemon_threads = True
+
+    def __init__(self, path=None, idle_timeout=None):
+        """
+        Init the Class. The daemon shuts down after idle_timeout seconds without any command.
+        """
+        self.path = path or daemon_socket()
+        if os.path.exists(self.path):
+            if forward_to_daemon({"ping": True}, self.path) is not None:
+                raise ApiException("Daemon already running on {}".format(self.path))
+            # Left behind by a daemon which got killed
+            os.unlink(self.path)
+        umask = os.umask(0o177)
+        try:
+            super().__init__(self.path, VcoDaemonHandler)
+        finally:
+            os.umask(umask)
+        self.clients = {}
+        self.idle_timeout = idle_timeout
+        self.last = time.time()
+        self._lock = threading.Lock()
+
+    def client(self, args, env=None):
+        """
+        Returns the client sharing session and cache for the given VCO, cache options and session environment of the caller
+        """
+        env = env or {}
+        key = (args.get("hostname"), bool(args.get("cache")), args.get("cache_ttl"), tuple(sorted(env.items())))
+        with self._lock:
+            if key not in self.clients:
+                cache = VcoResponseCache(ttl=args.get("cache_ttl"), memory=1024) if args.get("cache") else None
+                self.clients[key] = VcoRequestManager(args.get("hostname"), pool_size=args.get("workers") or 1, cache=cache, retries=args.get("retries") or 0, **env)
+            return self.clients[key]
+
+    def execute(self, args, env=None):
+        """
+        Executes the parsed arguments of a command, returns what the command prints or None
+        """
+        self.last = time.time()
+        obj = VcoApiExecute(**dict(args, sessions=lambda vco: self.client(dict(args, hostname=vco), env)))
+        self.last = time.time()
+        return None if obj.p is None else str(obj.p)
+
+    def run(self):
+        """
+        Serves until stopped, terminated or idle for too long, then removes the socket
+        """
+        load_pandas()
+        if not isinstance(sys.stderr, VcoDaemonStderr):
+            sys.stderr = VcoDaemonStderr(sys.stderr)
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=self.shutdown).start())
+        if self.idle_timeout:
+            def idle():
+                while time.time() - self.last < self.idle_timeout:
+                    time.sleep(1)
+                self.shutdown()
+            threading.Thread(target=idle, daemon=True).start()
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+def forward_to_daemon(request, path=None):
+    """
+    Sends a request (e.g. {"args": vars(args)}) to the running daemon and returns its response.
+    Returns None if no daemon is running, so the command can be executed in-process instead.
+    """
+    path = path or daemon_socket()
+    if not os.path.exists(path):
+        return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+    except OSError:
+        s.close()
+        return None
+    with s, s.makefile("rwb") as f:
+        f.write(json.dumps(request).encode() + b"\n")
+        f.flush()
+        response = json.loads(f.readline() or b"{}")
+    if response.get("stderr"):
+        sys.stderr.write(response["stderr"])
+    if "error" in response:
+        raise (ApiException if response.get("type") == "ApiException" else VcoApiExecuteError)(response["error"])
+    return response
+
+def expand_references(line, results):
+    """
+    Replaces ${name} and ${name.key.subkey} within a script line by the result stored under name, e.g.
+    ${customers.id} by the comma separated ids of all entries, which every enterpriseid option accepts
+    """
+    def value(m):
+        if m.group(1) not in results:
+            raise VcoApiExecuteError("Unknown reference ${{{}}}".format(m.group(0)[2:-1]))
+        r = results[m.group(1)]
+        values = []
+        for x in (r if isinstance(r, list) else [r]):
+            for k in (m.group(2).split(".") if m.group(2) else []):
+                x = x.get(k) if isinstance(x, dict) else None
+            if x is not None:
+                values.append(x if isinstance(x, str) else json.dumps(x))
+        if not values:
+            raise VcoApiExecuteError("Reference {} is empty".format(m.group(0)))
+        return shlex.quote(",".join(values))
+    return re.sub(r"\$\{(\w+)(?:\.([\w.]+))?\}", value, line)
+
+def run_script(parser, args):
+    """
+    Runs the commands of a script file (or stdin) within one process, sharing one session per VCO.
+    Each line is a command as given to vcoclient.py, e.g. "edges_get_simple --enterpriseid 5".
+    "name = command" stores the result under name instead of printing it, to be referenced by later
+    lines as ${name.key}. "for x in ${name.key}: command" runs the command once per value, given as ${x}.
+    Empty lines and lines starting with # are skipped. Stops at the first error.
+    """
+    # Global options given to run are the defaults of every line
+    options = [a.dest for a in parser._actions if a.option_strings and a.dest != "help"]
+    parser.set_defaults(**{k: getattr(args, k) for k in options})
+    f = sys.stdin if args.file == "-" else open(args.file)
+    clients = {}
+    results = {}
+
+    def session(vco, a):
+        if vco not in clients:
+            cache = VcoResponseCache(ttl=a.cache_ttl) if a.cache else None
+            clients[vco] = VcoRequestManager(vco, pool_size=a.workers or 1, cache=cache, retries=a.retries)
+        return clients[vco]
+
+    try:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            name = var = None
+            values = [None]
+            m = re.match(r"for\s+(\w+)\s+in\s+([^:]+):\s*(.*)$", line)
+            if m:
+                var, line = m.group(1), m.group(3)
+                try:
+                    values = shlex.split(expand_references(m.group(2), results))[0].split(",")
+                except Exception as e:
+                    raise VcoApiExecuteError("{}:{}: {}".format(args.file, n, e)) from None
+            m = re.match(r"(\w+)\s*=\s*(.*)$", line)
+            if m:
+                name, line = m.group(1), m.group(2)
+            for value in values:
+                if var:
+                    results[var] = value
+                try:
+                    a = parser.parse_args(shlex.split(expand_references(line, results)))
+                    if "dest" not in a or a.dest == "run":
+                        raise VcoApiExecuteError("Not a method: {}".format(line))
+                    obj = VcoApiExecute(**dict(vars(a), sessions=lambda vco: session(vco, a), raw=bool(name)))
+                except SystemExit:
+                    raise VcoApiExecuteError("{}:{}: invalid arguments".format(args.file, n)) from None
+                except Exception as e:
+                    raise VcoApiExecuteError("{}:{}: {}".format(args.file, n, e)) from None
+                if name:
+                    results[name] = obj.result
+                elif obj.p is not None:
+                    print(obj.p)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return clients
+
+def start_profile(profile):
+    """
+    Starts the given profiler, returns its handle
+    """
+    if profile == "cprofile":
+        import cProfile
+        p = cProfile.Profile()
+        p.enable()
+        return p
+    if profile == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start(25)
+    return None
+
+def stop_profile(profile, handle, path=None, top=30):
+    """
+    Stops the given profiler and writes its result to path or the top entries to stderr
+    """
+    if profile == "cprofile":
+        import pstats
+        handle.disable()
+        if path:
+            handle.dump_stats(path)
+        else:
+            pstats.Stats(handle, stream=sys.stderr).sort_stats("cumulative").print_stats(top)
+    elif profile == "tracemalloc":
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = snapshot.statistics("lineno")
+        out = open(path, "w") if path else sys.stderr
+        try:
+            print("current {} bytes, peak {} bytes".format(current, peak), file=out)
+            for stat in stats if path else stats[:top]:
+                print(stat, file=out)
+        finally:
+            if path:
+                out.close()
+
+def build_parser():
+    """
+    Builds the argparse object out of the config dicts defined
     """
     parser = argparse.ArgumentParser(description="A simple VeloCloud Orchestrator (VCO) client via Python")
     parser.add_argument("--vco", action="store", type=str, dest="hostname", default=os.getenv('VCO_HOST', None),
-                        help="Hostname/IP of VCO")
-    parser.add_argument("--output", action="store", type=str, dest="output", default="pandas", choices=["pandas", "json", "csv"],
-                        help="Pandas tables are used as default output method but one can also use 'json' or 'csv'")
+                        help="Hostname/IP of VCO. Several VCOs, given comma separated or as @file with one hostname per line, are queried concurrently and their results merged, tagged with the vco.")
+    parser.add_argument("--output", action="store", type=str, dest="output", default="pandas", choices=["pandas", "json", "csv", "ndjson"],
+                        help="Pandas tables are used as default output method but one can also use 'json', 'csv' or 'ndjson' (one json object per line)")
+    parser.add_argument("--stream", action="store_true", dest="stream", default=False,
+                        help="Together with --output=ndjson, decodes the response while it is received and writes out every entry immediately, keeping memory flat for very large results.")
+    parser.add_argument("--batch-size", action="store", type=int, dest="batch_size", default=int(os.getenv('VCO_BATCH_SIZE', 100)),
+                        help="Maximum number of API calls sent within one JSON-RPC batch request, e.g. when several enterpriseids are given.")
+    parser.add_argument("--workers", action="store", type=int, dest="workers", default=int(os.getenv('VCO_WORKERS', 4)),
+                        help="Maximum number of concurrent requests, e.g. when several enterpriseids are given.")
+    parser.add_argument("--retries", action="store", type=int, dest="retries", default=int(os.getenv('VCO_RETRIES', 4)),
+                        help="Retries of reading methods on throttling (HTTP 429/502/503/504), connection errors or non JSON responses, with jittered exponential backoff. Writes are never retried. Concurrent requests are additionally reduced while the VCO throttles.")
+    parser.add_argument("--checkpoint", action="store", type=str, dest="checkpoint", default=None,
+                        help="Records every completed API call and its result in a journal within the given directory. A rerun of an interrupted export skips the recorded calls and fetches only the missing ones. Logs in again via VCO_USER and VCO_PASS if the session expired.")
+    parser.add_argument("--async", action="store_true", dest="use_async", default=False,
+                        help="Runs the concurrent requests (e.g. of several enterpriseids or --slice) on one asyncio event loop, where --workers is the number of requests in flight. Needs aiohttp.")
+    parser.add_argument("--diff-against", action="store", type=str, dest="diff_against", default=None,
+                        help="Outputs only the entries (e.g. edges, keyed by id) added, removed or changed since the last run with the same snapshot file, changed ones with the changed fields only, and updates the snapshot.")
+    parser.add_argument("--max-memory", action="store", type=valid_size_type, dest="max_memory", default=os.getenv('VCO_MAX_MEMORY', None),
+                        help="Budget of the table built out of the result, e.g. 512M or 2G. Nested subtrees not asked for by --filters (e.g. configuration) are left out, largest first, if the table would exceed it.")
+    parser.add_argument("--cache", action="store_true", dest="cache", default=False,
+                        help="Uses the on-disk response cache: responses of methods listing customers, edges and gateways are cached for a short time, per VCO and login.")
+    parser.add_argument("--no-cache", action="store_false", dest="cache",
+                        help="Does not use the response cache (the default), e.g. to override --cache within a script.")
+    parser.add_argument("--cache-ttl", action="store", type=int, dest="cache_ttl", default=None,
+                        help="Overrides the time in seconds responses are cached. Metrics and writes are never cached.")
+    parser.add_argument("--cache-stats", action="store_true", dest="cache_stats", default=False,
+                        help="Prints the hit/miss counters of the response cache to stderr.")
+    parser.add_argument("--timings", action="store_true", dest="timings", default=False,
+                        help="Prints the time spent per phase (e.g. cookie, http, decode, normalize, transpose, output, print), the bytes received and the rows/columns of the result as json to stderr.")
+    parser.add_argument("--profile", action="store", type=str, dest="profile", default=None, choices=["cprofile", "tracemalloc"],
+                        help="Profiles the call with cProfile (cpu time per function) or tracemalloc (memory per line) and prints the top entries to stderr.")
+    parser.add_argument("--profile-file", action="store", type=str, dest="profile_file", default=None,
+                        help="Writes the whole profile to the given file instead, e.g. to be opened by snakeviz for cprofile.")
+    parser.add_argument("--no-daemon", action="store_false", dest="use_daemon", default=True,
+                        help="Executes the command in-process, even if a daemon (see the daemon method) is running.")
     parser.add_argument("--no-transpose", action="store_false", dest="transpose", default=True,
                         help="Data is represented via name as columns, and values as rows. If you want it the other way, that is possible via this setting it.")
     
@@ -516,12 +3452,63 @@ if __name__ == "__main__":
             dic[method].add_argument("--{}".format(key), **args)
         dic[method].set_defaults(dest=method)
 
+    daemon = subparsers.add_parser("daemon", description="Runs in the foreground as daemon keeping sessions, connections, decoded responses and pandas in memory. While it is running, every other command (except run, live_watch and those using --stream, --timings, --profile or --cache-stats) is forwarded to it over a Unix socket instead of being executed in-process.")
+    daemon.add_argument("--socket", action="store", type=str, default=daemon_socket(), help="Path of the Unix socket, default VCO_DAEMON_SOCKET or VCO_COOKIE_PATH/vcoclient.sock")
+    daemon.add_argument("--idle-timeout", action="store", type=valid_duration_type, dest="idle_timeout", default=None, help="Shuts down after the given duration (e.g. 30m) without any command. Default never.")
+    daemon.add_argument("--stop", action="store_true", default=False, help="Stops the running daemon")
+    daemon.set_defaults(dest="daemon")
+
+    run = subparsers.add_parser("run", description="Runs the commands of a script (one per line, e.g. 'edges_get_simple --enterpriseid 5') within one process and one session. 'name = command' stores the result, to be used by later commands as ${name.key}, e.g. --enterpriseid ${customers.id}.")
+    run.add_argument("file", nargs="?", default="-", help="Script to run, default stdin")
+    run.set_defaults(dest="run")
+
+    return parser
+
 
+if __name__ == "__main__":
+    """
+    Based on the arguements provided, it will execute a given function
+    """
+    parser = build_parser()
     args = parser.parse_args()
 
+    forwarded = None
+    if "dest" in args and args.use_daemon and args.dest not in ("run", "daemon", "live_watch") and not (args.stream or args.timings or args.profile or args.cache_stats):
+        forwarded = forward_to_daemon(daemon_request(vars(args)))
+
     if "dest" not in args:
         parser.print_help(sys.stderr)
+    elif forwarded is not None:
+        if forwarded["stdout"] is not None:
+            print(forwarded["stdout"])
+    elif args.dest == "daemon":
+        if args.stop:
+            forward_to_daemon({"stop": True}, args.socket)
+        else:
+            VcoDaemon(args.socket, args.idle_timeout / 1000 if args.idle_timeout else None).run()
     else:
-        obj = VcoApiExecute(**vars(args))
-        if obj.p is not None:
-            print(obj.p)
+        profile = start_profile(args.profile)
+        timings = []
+        try:
+            if args.dest == "run":
+                clients = run_script(parser, args).values()
+            else:
+                obj = VcoApiExecute(**vars(args))
+                clients = obj.clients
+                # Of several VCOs, the merged result is formatted and printed outside of any client
+                if obj.client is None:
+                    timings.append(obj.timings)
+                # A DataFrame is only rendered to text when printed
+                with obj.timings.phase("print"):
+                    if obj.p is not None:
+                        print(obj.p)
+        finally:
+            stop_profile(args.profile, profile, args.profile_file)
+        for client in clients:
+            if args.cache_stats and client.cache is not None:
+                print(json.dumps(client.cache.stats()), file=sys.stderr)
+            if args.timings:
+                print(json.dumps(client.timings.report()), file=sys.stderr)
+        for t in timings:
+            if args.timings:
+                print(json.dumps(t.report()), file=sys.stderr)
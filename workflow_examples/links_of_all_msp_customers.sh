@@ -0,0 +1,16 @@
+#!/bin/bash
+
+# Uncomment this line to export right VCO_HOST, VCO_USER and VCO_PASS
+#export VCO_HOST=""
+#export VCO_USER=""
+#export VCO_PASS=""
+
+# All steps run within one vcoclient.py process and one session, instead of one process per step.
+# Results are stored via "name = method" and referenced by later steps via ${name.key}.
+vcoclient.py --output=csv run <<'SCRIPT'
+login --no-operator
+customers = msp_customers_get
+edges_get_simple --enterpriseid ${customers.id} --search=* --filters=interface
+for id in ${customers.id}: edges_get_agg_lm --enterpriseid ${id} --starttime 2019-10-01 --filters=bytes
+logout
+SCRIPT
@@ -13,23 +13,16 @@ if [ $? -eq 1 ]; then
     exit 1
 fi
 
-# Trying to get all customers for MSP from VCO
-RET=$(vcoclient.py --output=json msp_customers_get | jq '.[].id' )
-if [ $? -eq 1 ]; then
-    echo $RET
-    exit 1
-fi
-
-# Executing the edges_get method 
+# Executing the edges_get method for all customers at once. The enterpriseId
+# row tells in which customer the value was found.
 
 SEARCH=$1
-for ID in  $RET; do
-    RET=$(vcoclient.py --output=csv edges_get --search=$SEARCH --id=$ID)
-    if [ ${#RET} -ge 3 ]; then
-        echo "'$ID' found '$SEARCH':"
-        echo $RET
-    fi
-done
+RET=$(vcoclient.py --output=csv edges_get_simple --search=$SEARCH --enterpriseid=all)
+if [ ${#RET} -ge 3 ]; then
+    echo "Found '$SEARCH':"
+    echo "$RET"
+fi
+
 # Execute the logout method 
 RET=$(vcoclient.py logout)
 